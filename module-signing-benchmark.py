@@ -0,0 +1,361 @@
+#!/usr/bin/env python3
+
+#License
+'''
+    MIT License (LICENSE.txt)
+
+    Copyright (c) 2016 Kieran Gillibrand
+'''
+
+#Description
+'''
+    Module Signing Script Benchmark
+
+    Generates a synthetic kernel tree (modules directories, kernel source directories with a stub sign-file and a stub akmods) in a temporary directory
+    and runs module-signing-script.py against it with each backend and worker count, without root and without real kernels.
+
+    End to end times are measured around each run of the script, per phase times come from its --metrics output.
+'''
+
+#Metadata
+__title__ = 'Module Signing Script Benchmark'
+__author__ = 'Kieran Gillibrand'
+__host__ = 'https://github.com/Favorablestream/Module-Signing-Script'
+__copyright__ = 'Copyright 2016 Kieran Gillibrand'
+__license__ = 'MIT License (LICENSE.txt)'
+
+#Imports
+import sys
+import os
+import hashlib
+import subprocess
+
+import argparse
+
+import json
+import random
+import shutil
+import statistics
+import tempfile
+import time
+import lzma
+import gzip
+
+import importlib.util
+import collections
+
+SCRIPT_PATH = os.path.join (os.path.dirname (os.path.abspath (__file__)), 'module-signing-script.py')
+'''The script being benchmarked'''
+
+BODY_PATH = os.path.join (os.path.dirname (os.path.abspath (__file__)), 'module_signing.py')
+'''The signing code of the script, imported to create the stub signature'''
+
+BenchmarkTree = collections.namedtuple ('BenchmarkTree', ['root', 'modules_root', 'kernel_sources_root', 'akmods_path', 'modules_file', 'private_key_path', 'public_key_path', 'kernels', 'module_paths', 'module_bytes'])
+'''
+    A generated kernel tree
+
+    modules_root and kernel_sources_root are passed to the script as --modules-root and --kernel-sources-root, akmods_path as --akmods-command
+    module_paths are the generated modules and module_bytes their total uncompressed size
+'''
+
+Scenario = collections.namedtuple ('Scenario', ['name', 'arguments', 'reset', 'warm_up'], defaults = [False])
+'''
+    A way of running the script: its extra arguments and whether the modules are replaced with unsigned ones (and the manifest removed) before each run
+
+    warm_up runs the scenario once more before the timed runs, Ex: to fill the signature cache. The script runs in the tree's directory so arguments can name files in it
+'''
+
+def load_signing_script ():
+    '''
+        Imports module_signing.py, the signing code of the script, to reuse it (module)
+    '''
+
+    spec = importlib.util.spec_from_file_location ('module_signing', BODY_PATH)
+    signing_script = importlib.util.module_from_spec (spec)
+    spec.loader.exec_module (signing_script)
+
+    return signing_script
+
+def create_keys (directory: str) -> tuple:
+    '''
+        Creates a throwaway RSA key and self signed DER certificate with openssl and returns their paths (tuple <str, str>)
+
+        directory (str): The directory to create the key files in
+    '''
+
+    private_key_path = os.path.join (directory, 'benchmark.priv')
+    public_key_path = os.path.join (directory, 'benchmark.der')
+
+    subprocess.run (['openssl', 'req', '-new', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1', '-subj', '/CN=Module Signing Script Benchmark', '-keyout', private_key_path, '-outform', 'DER', '-out', public_key_path], check = True, stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL)
+
+    return (private_key_path, public_key_path)
+
+def write_executable (path: str, content: str):
+    '''
+        Writes a script and makes it executable (void)
+
+        path (str): The path of the script
+        content (str): The script
+    '''
+
+    os.makedirs (os.path.dirname (path), exist_ok = True)
+
+    with open (path, 'w') as script_file:
+        script_file.write (content)
+
+    os.chmod (path, 0o755)
+
+def write_modules (tree: BenchmarkTree, compression: str, seed: int):
+    '''
+        Writes every module of the tree again, unsigned, with the same content each time (void)
+        Half of each module is random and half is zeros so compressed modules compress about as well as real ones
+
+        tree (BenchmarkTree): The tree to write the modules of
+        compression (str): none, xz or gzip
+        seed (int): Seed for the random module content
+    '''
+
+    module_size = tree.module_bytes // max (len (tree.module_paths), 1)
+    random_bytes = random.Random (seed).randbytes (module_size // 2)
+
+    for index, module_path in enumerate (tree.module_paths):
+        #Each module starts with its index so no two modules are the same
+        module_data = index.to_bytes (8, 'little') + random_bytes + bytes (module_size - len (random_bytes) - 8)
+
+        if compression == 'xz':
+            module_data = lzma.compress (module_data, format = lzma.FORMAT_XZ, check = lzma.CHECK_CRC32, preset = 1)
+
+        elif compression == 'gzip':
+            module_data = gzip.compress (module_data, compresslevel = 1, mtime = 0)
+
+        with open (module_path, 'wb') as module_file:
+            module_file.write (module_data)
+
+def create_tree (root: str, kernel_count: int, module_count: int, module_size: int, compression: str, akmods_delay: float, seed: int) -> BenchmarkTree:
+    '''
+        Generates the kernel tree, keys, modules JSON file and stubs in a directory (BenchmarkTree)
+        The stub sign-file appends (or with -d writes) a signature made once with the native backend, so it costs a process start and a write like the real one but no RSA operation
+
+        root (str): The directory to generate the tree in
+        kernel_count (int): Number of kernels
+        module_count (int): Number of modules per kernel
+        module_size (int): Uncompressed size of each module in bytes
+        compression (str): none, xz or gzip
+        akmods_delay (float): Seconds the stub akmods sleeps for each kernel
+        seed (int): Seed for the random module content
+    '''
+
+    signing_script = load_signing_script ()
+
+    modules_root = os.path.join (root, 'usr', 'lib', 'modules')
+    kernel_sources_root = os.path.join (root, 'usr', 'src', 'kernels')
+
+    private_key_path, public_key_path = create_keys (root)
+
+    signing_key = signing_script.load_signing_key (private_key_path, public_key_path)
+    signature = signing_script.create_multi_signer_signature ([(signing_key, 'sha256')], {'sha256': hashlib.sha256 (b'').digest ()})
+
+    signature_path = os.path.join (root, 'stub-signature')
+    with open (signature_path, 'wb') as signature_file:
+        signature_file.write (signature)
+
+    #sign-file -d writes only the CMS signature, without the module_signature struct and magic string
+    detached_signature_path = os.path.join (root, 'stub-signature.p7s')
+    with open (detached_signature_path, 'wb') as signature_file:
+        signature_file.write (signature [:-signing_script.MODULE_TRAILER_SIZE])
+
+    akmods_path = os.path.join (root, 'bin', 'akmods')
+    write_executable (akmods_path, '#!/bin/sh\nsleep %g\n' %akmods_delay)
+
+    suffix = {'none': '', 'xz': '.xz', 'gzip': '.gz'} [compression]
+    kernels = ['6.%d.0-100.benchmark.x86_64' %kernel_index for kernel_index in range (kernel_count)]
+    module_paths = []
+
+    for kernel in kernels:
+        module_directory = os.path.join (modules_root, kernel, 'extra', 'benchmark')
+        os.makedirs (module_directory)
+
+        module_paths += [os.path.join (module_directory, 'benchmark%04d.ko%s' %(module_index, suffix)) for module_index in range (module_count)]
+
+        #sign-file [-d] HASH_ALGORITHM PRIVATE_KEY PUBLIC_KEY MODULE
+        write_executable (os.path.join (kernel_sources_root, kernel, 'scripts', 'sign-file'), '#!/bin/sh\nif [ "$1" = -d ]; then cat \'%s\' > "$5.p7s"; else cat \'%s\' >> "$4"; fi\n' %(detached_signature_path, signature_path))
+
+    modules_file = os.path.join (root, 'modules.json')
+    with open (modules_file, 'w') as json_file:
+        json.dump ({'module_entries': [{'name': 'Benchmark', 'directory': 'extra/benchmark/', 'module_files': ['benchmark*.ko']}]}, json_file)
+
+    tree = BenchmarkTree (root, modules_root, kernel_sources_root, akmods_path, modules_file, private_key_path, public_key_path, kernels, module_paths, module_size * len (module_paths))
+    write_modules (tree, compression, seed)
+
+    return tree
+
+def get_scenarios (jobs: int, build_jobs: int) -> list:
+    '''
+        Returns the scenarios in the order they are run, the ones which don't reset the tree run on the modules signed by the scenario before them (list <Scenario>)
+
+        jobs (int): Number of signing workers for the parallel scenarios
+        build_jobs (int): Number of akmods builds at once for the parallel scenarios
+    '''
+
+    return [
+        Scenario ('sign-file-serial', ['-b', 'sign-file', '-j', '1', '--build-jobs', '1'], True),
+        Scenario ('sign-file-parallel', ['-b', 'sign-file', '-j', str (jobs), '--build-jobs', str (build_jobs)], True),
+        Scenario ('native-serial', ['-b', 'native', '-j', '1', '--build-jobs', '1'], True),
+        Scenario ('native-parallel', ['-b', 'native', '-j', str (jobs), '--build-jobs', str (build_jobs)], True),
+        Scenario ('native-cached', ['-b', 'native', '-j', str (jobs), '--build-jobs', str (build_jobs), '--signature-cache', 'signature-cache'], True, True),
+        Scenario ('rerun-manifest', ['-b', 'native', '-j', str (jobs), '--build-jobs', str (build_jobs)], False),
+        Scenario ('rerun-no-manifest', ['-b', 'native', '-j', str (jobs), '--build-jobs', str (build_jobs), '-m', ''], False),
+        Scenario ('verify', ['--verify', '-j', str (jobs), '--report', os.devnull], False)
+    ]
+
+def run_scenario (tree: BenchmarkTree, scenario: Scenario, compression: str, seed: int) -> dict:
+    '''
+        Runs the script once for a scenario and returns the end to end time, exit status and the --metrics output (dict)
+
+        tree (BenchmarkTree): The tree to run against
+        scenario (Scenario): The scenario to run
+        compression (str): none, xz or gzip, used to reset the modules
+        seed (int): Seed for the random module content, used to reset the modules
+    '''
+
+    manifest_path = os.path.join (tree.root, 'manifest.json')
+    journal_path = os.path.join (tree.root, 'journal.jsonl')
+    metrics_path = os.path.join (tree.root, 'metrics.json')
+
+    if scenario.reset:
+        write_modules (tree, compression, seed)
+
+        if os.path.exists (manifest_path):
+            os.remove (manifest_path)
+
+    #The privileged helper is started as the current user, the stubs don't need root
+    command = [sys.executable, SCRIPT_PATH, tree.modules_file, tree.private_key_path, tree.public_key_path, '-k'] + tree.kernels
+    command += ['--modules-root', tree.modules_root, '--kernel-sources-root', tree.kernel_sources_root, '--akmods-command', tree.akmods_path, '--elevate-command', '', '-m', manifest_path, '--journal', journal_path, '--plan-cache', '', '--metrics', metrics_path]
+    command += scenario.arguments
+
+    run_start = time.monotonic ()
+    completed = subprocess.run (command, stdout = subprocess.PIPE, stderr = subprocess.STDOUT, universal_newlines = True, cwd = tree.root)
+    run_seconds = time.monotonic () - run_start
+
+    if completed.returncode != 0:
+        print (completed.stdout)
+
+    with open (metrics_path) as metrics_file:
+        metrics = json.load (metrics_file)
+
+    return {'seconds': run_seconds, 'exit_status': completed.returncode, 'metrics': metrics}
+
+def summarise_runs (tree: BenchmarkTree, scenario: Scenario, runs: list) -> dict:
+    '''
+        Picks the run with the median end to end time and works out its throughput (dict)
+
+        tree (BenchmarkTree): The tree the runs used
+        scenario (Scenario): The scenario that was run
+        runs (list <dict>): The results from run_scenario ()
+    '''
+
+    median_seconds = statistics.median_low ([run ['seconds'] for run in runs])
+    run = [run for run in runs if run ['seconds'] == median_seconds] [0]
+
+    module_count = len (tree.module_paths)
+    phases = {}
+
+    for phase, phase_statistics in run ['metrics']['phases'].items ():
+        phases [phase] = {'seconds': phase_statistics ['seconds'], 'count': phase_statistics ['count'], 'per_second': phase_statistics ['count'] / max (phase_statistics ['seconds'], 1e-9)}
+
+    return {
+        'scenario': scenario.name,
+        'arguments': scenario.arguments,
+        'exit_status': run ['exit_status'],
+        'seconds': run ['seconds'],
+        'all_seconds': [run ['seconds'] for run in runs],
+        'modules_per_second': module_count / run ['seconds'],
+        'mib_per_second': tree.module_bytes / 1048576 / run ['seconds'],
+        'counters': run ['metrics']['counters'],
+        'phases': phases
+    }
+
+def print_results (results: list):
+    '''
+        Prints the end to end results of every scenario as a table followed by the per phase times (void)
+
+        results (list <dict>): The results from summarise_runs ()
+    '''
+
+    print ('%-20s %8s %8s %10s %10s %8s %8s %8s' %('Scenario', 'Status', 'Seconds', 'Modules/s', 'MiB/s', 'Signed', 'Skipped', 'Failed'))
+
+    for result in results:
+        counters = result ['counters']
+        print ('%-20s %8d %8.2f %10.1f %10.1f %8d %8d %8d' %(result ['scenario'], result ['exit_status'], result ['seconds'], result ['modules_per_second'], result ['mib_per_second'], counters ['modules_signed'], counters ['modules_skipped'], counters ['modules_failed']))
+
+    print ()
+    print ('%-20s %-26s %10s %8s %10s' %('Scenario', 'Phase', 'Seconds', 'Count', 'Per second'))
+
+    for result in results:
+        for phase, phase_result in sorted (result ['phases'].items ()):
+            print ('%-20s %-26s %10.3f %8d %10.1f' %(result ['scenario'], phase, phase_result ['seconds'], phase_result ['count'], phase_result ['per_second']))
+
+def main ():
+    '''
+        Main method for the benchmark (void).
+    '''
+
+    parser = argparse.ArgumentParser (description = 'Benchmarks module-signing-script.py against a generated kernel tree with stub sign-file and akmods commands, without root.')
+    parser.add_argument ('--kernels', type = int, default = 3, help = '(Optional) Number of kernels in the tree (default: 3)')
+    parser.add_argument ('--modules', type = int, default = 50, help = '(Optional) Number of modules per kernel (default: 50)')
+    parser.add_argument ('--module-size', type = int, default = 256, help = '(Optional) Uncompressed size of each module in KiB (default: 256)')
+    parser.add_argument ('--compression', choices = ['none', 'xz', 'gzip'], default = 'none', help = '(Optional) Compress the modules (default: none)')
+    parser.add_argument ('--akmods-delay', type = float, default = 0.0, help = '(Optional) Seconds the stub akmods takes for each kernel (default: 0)')
+    parser.add_argument ('-j', '--jobs', type = int, default = os.cpu_count () or 1, help = '(Optional) Signing workers for the parallel scenarios (default: the number of CPUs)')
+    parser.add_argument ('--build-jobs', type = int, default = 2, help = '(Optional) akmods builds at once for the parallel scenarios (default: 2)')
+    parser.add_argument ('--scenarios', nargs = '+', help = '(Optional) Only run these scenarios (default: all)')
+    parser.add_argument ('--repeat', type = int, default = 1, help = '(Optional) Runs of each scenario, the run with the median time is reported (default: 1)')
+    parser.add_argument ('--seed', type = int, default = 0, help = '(Optional) Seed for the module content (default: 0)')
+    parser.add_argument ('--output', help = '(Optional) File to write the results to as JSON, for comparing runs')
+    parser.add_argument ('--keep', help = '(Optional) Keep the generated tree and print its path', action = 'store_true')
+    args = parser.parse_args ()
+
+    scenarios = get_scenarios (max (args.jobs, 1), max (args.build_jobs, 1))
+
+    if args.scenarios != None:
+        unknown_scenarios = set (args.scenarios) - {scenario.name for scenario in scenarios}
+
+        if len (unknown_scenarios) > 0:
+            parser.error ('Unknown scenarios: %s (choose from %s)' %(', '.join (sorted (unknown_scenarios)), ', '.join (scenario.name for scenario in scenarios)))
+
+        scenarios = [scenario for scenario in scenarios if scenario.name in args.scenarios]
+
+    root = tempfile.mkdtemp (prefix = 'module-signing-benchmark-')
+
+    try:
+        tree = create_tree (root, args.kernels, args.modules, args.module_size * 1024, args.compression, args.akmods_delay, args.seed)
+
+        print ('%d kernel(s) with %d module(s) of %d KiB each (%s), %d signing worker(s) and %d akmods build(s) at once for the parallel scenarios' %(args.kernels, args.modules, args.module_size, args.compression, args.jobs, args.build_jobs))
+        print ()
+
+        results = []
+
+        for scenario in scenarios:
+            if scenario.warm_up:
+                run_scenario (tree, scenario, args.compression, args.seed)
+
+            runs = [run_scenario (tree, scenario, args.compression, args.seed) for _ in range (max (args.repeat, 1))]
+            results.append (summarise_runs (tree, scenario, runs))
+
+        print_results (results)
+
+        if args.output != None:
+            with open (args.output, 'w') as output_file:
+                json.dump ({'kernels': args.kernels, 'modules': args.modules, 'module_size_kib': args.module_size, 'compression': args.compression, 'jobs': args.jobs, 'build_jobs': args.build_jobs, 'results': results}, output_file, indent = 4)
+                output_file.write ('\n')
+
+    finally:
+        if args.keep:
+            print ()
+            print ('Kept the generated tree in: %s' %root)
+
+        else:
+            shutil.rmtree (root, ignore_errors = True)
+
+if __name__ == '__main__':
+    main ()
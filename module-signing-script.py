@@ -24,7 +24,7 @@
     OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
     SOFTWARE.
 '''
-    
+
 #Description
 '''
     Nvidia Signing Script
@@ -33,6 +33,8 @@
     
     Will probably be run as a cron job. As of now I don't know how to trigger this when a new kernel is installed. Especially in a way independent of the package manager and package format.
     
+    This file only parses the arguments and checks the run plan so a cron run with nothing to do exits quickly, the signing code is in module_signing.py next to it.
+    
     Inspired by this guide: http://www.pellegrino.link/2015/11/29/signing-nvidia-proprietary-driver-on-fedora.html and by my gist which corrects some out of date things: https://gist.github.com/Favorablestream/4b6822e14a6e1267b1c46049274c8e49
 '''
 
@@ -52,462 +54,305 @@ __status__ = 'Personal Project (in development)'
 #Imports
 import sys
 import os
-import subprocess
+import time
 
 import argparse
-
 import re
-import pkg_resources
 
 import json
-
+import hashlib
 import contextlib
 
+#Only the modules needed to check the run plan are imported here, module_signing is imported once there is something to do
+BODY_PATH = os.path.join (os.path.dirname (os.path.abspath (__file__)), 'module_signing.py')
+'''The signing code, part of the run plan fingerprint'''
+
 DEBUG = False
 '''Global flag for debuging print statements, set by -debug/--debug'''
 
-#Helper methods called by other methods
-def debug_print (message: str, print_newline: bool = True):
+MODULES_ROOT = '/usr/lib/modules'
+'''Default directory containing a modules directory for each installed kernel (--modules-root)'''
+
+KERNEL_SOURCES_ROOT = '/usr/src/kernels'
+'''Default directory containing the kernel source (devel) directory, with scripts/sign-file, for each installed kernel (--kernel-sources-root)'''
+
+AKMODS_COMMAND = ['akmods']
+'''Default command (and arguments) used to build the kernel modules (--akmods-command)'''
+
+BOOT_ROOT = '/boot'
+'''Default directory containing the bootloader configuration read by --boot-default (--boot-root)'''
+
+HASH_ALGORITHMS = ['sha256', 'sha384', 'sha512']
+'''Hash algorithms a key can sign with, the ones module_signing.HASH_ALGORITHM_OIDS has an OID for'''
+
+KEY_POLICIES = ['first', 'newest', 'all']
+'''Ways of choosing the keys for a kernel, see module_signing.select_signers ()'''
+
+def debug_print (message: str):
     '''
         Print a message if debugging statements are enabled
         
         message (str): The message to print
-        print_newline (bool): Print an additional newline after the message (default True) 
-    '''
-    
-    if not DEBUG:
-        return
-        
-    print (message)
-    
-    if print_newline:
-        print ()
-        
-def non_debug_print (message: str, print_newline: bool = True):
-    '''
-        Print a message if debugging statements are not enabled
-        
-        message (str): The message to print
-        print_newline (bool): Print an additional newline after the message (default True)
     '''
     
     if DEBUG:
-        return
-    
-    print (message)
-    
-    if print_newline:
-        print ()
-
-
-def handle_error (message: str, exit_code: int, exception: Exception = None, command_exitcode: int = 0):
-    '''
-        Error handling function which displays a message, prints an exception (if provided), and exits with an exit code (void).
-    
-        message (str): The message to display before exiting
-        exit_code (int): The code to exit with
-        exception (Exception) (optional): The exception to print
-        command_exitcode (int) (optional): The exit code of the command that caused the error
-        
-        Script Exit codes
-        - 0: Success, normal exit code
-        - 1: Package manager not found
-        - 2: Unable to sign a kernel module
-        - 3: Unable to extract the kernel version string
-        - 4: Cannot open modules JSON file
-        - 5: Modules JSON content is malformed
-        - 6: Cannot access modules directory
-        - 7: Cannot build akmods for kernel
-    '''
-    
-    exit_codes = ['Success, normal exit', 'Package manager not found', 'Unable to sign a kernel module', 'Unable to extract kernel version string', 'Cannot open modules JSON file', 'Modules JSON content is malformed', 'Cannot access modules directory', 'Cannot build akmods for kernel']
-    
-    print ('Error: ' + message)
-    
-    if command_exitcode != 0:
-        print ('Last command exited with code %d' %command_exitcode)
-        
-    print ()
-    
-    if exception != None:
-        print (str (exception))
+        print (message)
         print ()
         
-    print ('Exiting with exit code: %d, %s' %(exit_code, exit_codes [exit_code]))
-    
-    sys.exit (exit_code)
+#Run plan cache, lets a run which would find nothing to do exit before discovering kernels, starting the helper or building anything
+RUN_PLAN_VERSION = 1
+'''Version of the run plan file layout, a plan with another version is ignored'''
+
+PACKAGE_DATABASE_PATHS = ['/usr/lib/sysimage/rpm/rpmdb.sqlite', '/var/lib/rpm/rpmdb.sqlite', '/var/lib/rpm/Packages', '/var/lib/dpkg/status', '/var/lib/pacman/local', '/usr/src/akmods']
+'''Files and directories which change when packages (kernels, akmod sources) are installed or removed'''
 
-def execute_with_output (command: str, args: list = []) -> str:
+def stat_fingerprint (path: str) -> list:
     '''
-        Fetches a process output, decodes it as a utf-8 string (by default), and returns it (str)
+        Returns the size and modification time of a path or None if it doesn't exist, for comparing it with a later run (list <int>)
         
-        command (str): The name of the command to run
-        args (list <string>) (optional): The arguments to supply to the command (-r, etc)
+        path (str): The path to the file or directory
     '''
     
-    ENCODING = 'utf-8'
-    '''Encoding to use for decoding process output'''
-    
-    args.insert (0, command) #check_output () expects the command and it's arguments in the same list
-    
     try:
-        response_bytes = subprocess.check_output (args)
+        path_stat = os.stat (path)
         
-    #An exception is raised if the command does not exist, pass it to the caller
     except (OSError):
-        raise
+        return None
         
-    return response_bytes.decode (ENCODING)
+    return [path_stat.st_size, path_stat.st_mtime_ns]
     
-def execute_with_exit_status (command: str, args: list = []) -> int:
+def get_run_fingerprint (args: argparse.Namespace) -> str:
     '''
-        Run a command without fetching the output while piping all output streams to /dev/null then return the program exit status (int)
-        
-        commandName (str): The name of the command to run
-        commandArgs (list <string>) (optional): The arguments to supply to the command (-r, etc)
-    '''    
-    
-    args.insert (0, command) #call () expects the command and it's arguments in the same list
-                
-    try:
-        exitStatus = subprocess.call (args, stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL)
-        
-    #An exception is raised if the command does not exist, return 127 status instead
-    except (OSError):
-        exitStatus = 127
+        Returns a hash of everything a run depends on other than the modules themselves (str)
+        Covers the arguments which select kernels and how they are signed, the modules JSON file and public key contents, the booted kernel,
+        the kernel root directories (which change when a kernel directory is added or removed), the package databases, the default boot entry with --boot-default and this script
         
-    return exitStatus
-
-def extract_kernel_version (input_line: str) -> str:
+        args (Namespace): The arguments parsed by main ()
     '''
-        Extracts a kernel version string (Ex: 4.7.2-201.fc24.x86_64) from a line of text (str)
-        Be sure to strip trailing newlines with rstrip () if you are splitting multiline output on newlines so that you don't pass an empty line to this method.
     
-        input_line (str): The line of output to extract the version string from
-    '''
+    inputs = {
+        'script': [__version__, stat_fingerprint (os.path.abspath (__file__)), stat_fingerprint (BODY_PATH)],
+        'arguments': [args.kernels, args.backend, args.discovery, args.modules_root, args.kernel_sources_root, args.akmods_command, args.private_key_file, args.key, args.hash_algorithm, args.key_policy, args.newest, args.require_headers, args.match, args.boot_default, args.boot_root],
+        'current_kernel': os.uname ().release,
+        'roots': [stat_fingerprint (os.path.abspath (args.modules_root)), stat_fingerprint (os.path.abspath (args.kernel_sources_root))],
+        'packages': [stat_fingerprint (path) for path in PACKAGE_DATABASE_PATHS]
+    }
     
-    match = re.search ('\d+(\d+|\.|\-|\_|[a-z]|[A-Z])*', input_line) #Match a digit then more digits, decimal points, dashes, or letters
+    #Only the default entry and the entries are compared, grub rewrites the rest of its environment on every boot (Ex: boot_success)
+    #Reading the bootloader configuration needs the signing code, which is otherwise only imported once there is something to do
+    if args.boot_default:
+        import module_signing
         
-    if match == None:
-        handle_error ('Unable to extract version string for input line: %s' %inputLine, exit_code = 3)
-            
-    version_string = match.group (0)
+        module_signing.BOOT_ROOT = os.path.abspath (args.boot_root)
         
-    #Sometimes . or - are used as a seperator and are picked up as the last character so remove that last character if it isn't a digit or letter
-    if not (version_string [-1:].isdigit () or version_string [-1:].isalpha ()):
-        version_string = version_string [:-1]
+        grub_environment = module_signing.read_grub_environment () or {}
+        inputs ['boot'] = [grub_environment.get ('next_entry'), grub_environment.get ('saved_entry'), module_signing.read_boot_entries ()]
+        
+    def hash_input (input_path: str) -> tuple:
+        try:
+            with open (input_path, 'rb') as input_file:
+                input_data = input_file.read ()
+                
+        except (OSError):
+            return (None, None)
             
-    return version_string
-    
-def compare_kernels (kernel1: str, kernel2: str) -> int:
-    '''
-        Compares two kernel version strings (ex: 4.7.2-200.fc24.x86_64 vs 4.5.5.fc24.x86_64).
-        Returns 1 if kernel1 is newer (greater), -1 if kernel2 is newer, and 0 if they are equal (int).
+        return (input_data, hashlib.sha256 (input_data).hexdigest ())
         
-        kernel1 (str): The first kernel version string
-        kernel2 (str): The second kernel version string
-    '''
-
-    debug_print ('---------------------------------------------', print_newline = False)
-    debug_print ('Kernel version comparison', print_newline = False)
-    debug_print ('Kernel version 1: %s' %kernel1, print_newline = False)
-    debug_print ('Kernel version 2: %s' %kernel2)
-    
-    kernel1_version = pkg_resources.parse_version (kernel1)
-    kernel2_version = pkg_resources.parse_version (kernel2)
-    
-    comparison_value = 0
+    modules_data, inputs ['modules_file'] = hash_input (args.modules_file)
+    public_key_paths = [args.public_key_file] + [public_key_path for _, public_key_path in args.key or []]
     
-    if kernel1_version > kernel2_version:
-        comparison_value = 1
-        
-        debug_print ('Kernel version 1 evaluated as newer')
-        
-    elif kernel1_version < kernel2_version:
-        comparison_value = -1
+    #Replacing a certificate of the modules JSON file in place changes which modules need signing too, a malformed file is reported by the run itself
+    with contextlib.suppress (ValueError, KeyError, TypeError, AttributeError):
+        public_key_paths += [os.path.join (os.path.dirname (os.path.abspath (args.modules_file)), key ['public_key']) for key in json.loads (modules_data).get ('keys', [])]
         
-        debug_print ('Kernel version 2 evaluated as newer')
-        
-    else:        
-        debug_print ('Kernel versions evaluated as equal')
-        
-    debug_print ('Return value: %d' %comparison_value, print_newline = False)
-    debug_print ('---------------------------------------------')
+    inputs ['public_keys'] = [hash_input (public_key_path) [1] for public_key_path in public_key_paths]
     
-    return comparison_value
+    return hashlib.sha256 (json.dumps (inputs, sort_keys = True).encode ()).hexdigest ()
     
-def get_module_entries (modules_path: str) -> list:
+def is_run_plan_current (plan_path: str, fingerprint: str) -> bool:
     '''
-        Parses the provided JSON file to get information for the modules to sign as a list of module entries (list)
+        Returns whether the last run left a plan with the same fingerprint and none of the modules or module directories it signed have changed since (bool)
         
-        modules_path (str): The path to the modules JSON file
+        plan_path (str): The path to the run plan file
+        fingerprint (str): The fingerprint of this run from get_run_fingerprint ()
     '''
     
     try:
-        with open (modules_path) as modules_file:
-            debug_print ('Using modules file: \'%s\'' %modules_path)
-                    
-            modules = json.loads (modules_file.read ())
-
-    except (IOError, OSError) as file_error:
-        handle_error ('Modules file: \'%s\' does not exist or cannot be opened' %modules_path, exception = file_error, exit_code = 4)
+        with open (plan_path) as plan_file:
+            plan = json.load (plan_file)
+            
+    except (OSError, ValueError):
+        return False
         
-    except (ValueError) as json_error:
-        handle_error ('Modules JSON file: \'%s\' is malformed, refer to the README or the exception message below for the correct format' %modules_path, exception = json_error, exit_code = 5)
+    if not isinstance (plan, dict) or plan.get ('version') != RUN_PLAN_VERSION or plan.get ('fingerprint') != fingerprint:
+        debug_print ('Run plan is out of date, the kernels, packages, inputs or arguments have changed')
         
-    return modules ["module_entries"]
-
-def build_akmods (kernel: str):
-    '''
-        Build the kernel modules for a kernel (void)
-        The akmods command exits with 0 if it builds modules or if they already exist for the specified kernel
-        --force causes akmods to run even building the modules previously failed
-        akmods requires root so sudo is called
+        return False
         
-        kernel (str): The kernel to build modules for
-    '''
-    if execute_with_exit_status ('sudo', ['akmods', '--kernels', kernel, '--force']) != 0:
-        handle_error ('Could not build akmods for kernel: %s' %kernel, exit_code = 7)
+    #A rebuilt module or a module added to an entry directory is signed by a full run
+    for path, path_fingerprint in plan ['paths'].items ():
+        if stat_fingerprint (path) != path_fingerprint:
+            debug_print ('Run plan is out of date, changed: %s' %path)
+            
+            return False
+            
+    return True
     
-@contextlib.contextmanager
-def change_working_directory (new_directory: str):
+def save_run_plan (plan_path: str, fingerprint: str, kernels: list, module_entries: list):
     '''
-        Generator method to change directory in an exception safe way (always returns to the original directory) (generator)
-        Borrowed from Stack Overflow after some research on how it works
+        Records the kernels a successful run signed, their modules and module entry directories so the next run can exit early if nothing changed (void)
+        A failure to write it is only reported in debug output since the next run will just do a full run
         
-        new_directory (str): The directory to switch to
+        plan_path (str): The path to the run plan file
+        fingerprint (str): The fingerprint from get_run_fingerprint (), taken before the run
+        kernels (list <str>): The kernels the run signed
+        module_entries (list): The module entries from the modules JSON file
     '''
-    previous_directory = os.getcwd ()
     
-    os.chdir (os.path.expanduser (new_directory))
+    #Only called by the signing code, so it is already imported
+    import module_signing
     
     try:
-        yield #Return until we're done with the generator
+        paths = module_signing.get_run_plan_paths (kernels, module_entries)
         
-    finally:
-        os.chdir (previous_directory) #Run once we're done
+    except (OSError) as directory_error:
+        debug_print ('Not saving the run plan, could not access modules directory: %s' %directory_error.filename)
         
-def sign_kernel (kernel: str, module_entries: list, private_key_path: str, public_key_path: str):
-    '''
-        Signs the kernel modules for a kernel (void).
-        
-        kernel (str): The kernel whose modules to sign
-        private_key_path (str): The path to the private key file to sign with
-        public_key_path (str): The path to the public key file to sign with
-    '''
-    
-    SIGN_BINARY_PATH = '/usr/src/kernels/' + kernel + '/scripts/sign-file'
-    '''Path to the sign-file binary used to sign the kernel modules'''
-    
-    BASE_MODULES_PATH = '/usr/lib/modules/' + kernel + '/'
-    '''Path to modules before the directory provided by each module entry is appended'''
-    
-    #Print if the user is not root (uid 0)
-    if os.getuid () != 0:
-        print ('Building kernel modules and signing them must be done as root. You may be prompted for your password:')
-        print ()
+        return
         
-    build_akmods (kernel)
+    temporary_path = plan_path + '.tmp'
     
-    debug_print ('Akmods have been built for kernel: %s or they already exist' %kernel)
-        
-    #Sign the modules for each entry in the JSON file
-    for module_entry in module_entries:
-        modules_path = BASE_MODULES_PATH + module_entry ['directory']
+    try:
+        os.makedirs (os.path.dirname (plan_path) or '.', exist_ok = True)
         
-        try:
-            with change_working_directory (modules_path):
-                module_files = module_entry ['module_files']
-                                
-                debug_print ('Switched to modules directory: %s' %modules_path, print_newline = False)
-                debug_print ('Kernel module files: %s' %module_entry ['module_files'])
+        with open (temporary_path, 'w') as plan_file:
+            json.dump ({'version': RUN_PLAN_VERSION, 'fingerprint': fingerprint, 'kernels': kernels, 'paths': {path: stat_fingerprint (path) for path in paths}}, plan_file, indent = 4)
             
-                #Sign all the modules in the list of modules and call handle_error if the exit status is not 0
-                #The sign-file binary needs to be called as root so sudo is called each time (though sudo was already called by build_akmods ())
-                #If this script is set up as a root cron job or the entire script is run as root then the sudo call isn't nessecary but has no effect
-                for module in module_files:
-                    debug_print ('Signing kernel module: %s' %module, print_newline = False)
-
-                    sign_status = execute_with_exit_status ('sudo', [SIGN_BINARY_PATH, 'sha256', private_key_path, public_key_path, module])
-                    if sign_status != 0:
-                        handle_error ('Error signing kernel module: %s (Check your password for sudo, that both your keyfiles have correct paths/exist, and the module entries in your json file)' %module, exit_code = 2, command_exitcode = sign_status)
+        os.replace (temporary_path, plan_path)
         
-        except (FileNotFoundError) as directory_error:
-            handle_error ('Could not move to modules directory: %s' %modules_path, exception = directory_error, exit_code = 6)
-            
-#Core methods called by main ()
-def get_package_manager () -> str:
-    '''
-        Returns the package manager for the current system (str)
-        There is no standard way to find the package manager so this function simply tests if the following are installed: rpm, dpkg, pacman
-    '''
-    
-    #Each branch tries to run the package manager by checking it's version.
-    #The package manager itself (ex: rpm) is called instead of a front end (ex: dnf) so more systems are covered
-    #Each is called with the --version argument since it should be one of the fastest commands for a package manager and returns an exit status of 0.
-    #Just running the package manager with no arguments usually returns an exit code of 1 in my experience even if it is installed.
-    #If the package manager is not installed a status of 127 is usually returned, either way we just look for 0.
-    #As is this will cause issues if multiple package managers are installed because only the first that is checked will be detected.
-        
-    #rpm (Red hat based systems)
-    if execute_with_exit_status ('rpm', ['--version']) == 0:
-        return 'rpm'
-        
-    #dpkg (Debian based systems)
-    elif execute_with_exit_status ('dpkg', ['--version']) == 0:
-        return 'dpkg'
+        debug_print ('Saved the run plan for %d kernel(s) and %d path(s) to: %s' %(len (kernels), len (paths), plan_path))
         
-    #pacman (Arch linux based systems)
-    elif execute_with_exit_status ('pacman', ['--version']) == 0:
-        return 'pacman'
+    except (OSError) as plan_error:
+        debug_print ('Could not save the run plan: %s (%s)' %(plan_path, plan_error))
         
-    #None of the above, sorry obscure package managers
-    else:
-        handle_error ('Package manager could not be determined', 1)
-    
-def get_current_kernel () -> str:
+def main ():
     '''
-        Returns the current kernel version (str)
+        Main method for this script (void).
+        Parses the arguments and exits straight away if the run plan shows there is nothing to do, otherwise imports the signing code and runs it
     '''
     
-    uname_output = execute_with_output ('uname', ['-r'])
-    uname_output.rstrip () #Single line output still contains trailing newline
+    global DEBUG
     
-    return extract_kernel_version (uname_output)
-            
-def get_installed_kernels (package_manager: str) -> list:
-    '''
-        Returns a list of the currently installed kernels (list <str>).
-        Calls a command depending on the package manager to list all installed kernels.
-        
-        packageManager (str): The system package manager fetched by get_package_manager ()
-    '''
-        
-    if package_manager == 'rpm':
-        output = execute_with_output ('rpm', ['-qa', 'kernel'])
-        
-    elif package_manager == 'dpkg':
-        output = execute_with_output ('dpkg', ['--list', '|', 'grep', 'linux-image'])
-        
-    elif packageManager == 'pacman':
-        output = execute_with_output ('pacman', ['-Q', '|', 'grep', 'linux'])
-
-    output = output.rstrip ()
-    output_lines = output.split ('\n')
+    run_start = time.time ()
+    run_clock_start = time.monotonic ()
     
-    kernel_versions = []
-    for line in output_lines:
-        version_string = extract_kernel_version (line)
-            
-        kernel_versions.append (version_string)
-        
-    return kernel_versions
+    #The privileged helper is this script started again by module_signing.start_helper_session ()
+    if sys.argv [1:2] == ['--privileged-helper']:
+        import module_signing
         
-def get_new_kernels (current_kernel: str, installed_kernels: list) -> list:
-    '''
-        Returns a list of all kernels that are newer than the currently booted one or exits if no kernels are newer than the currently booted one (list <str>)
-        
-        current_kernel (str): The currently booted kernel
-        installed_kernels (list <str>): A list of all the currently installed kernels
-    '''
+        sys.exit (module_signing.run_privileged_helper (sys.argv [2:]))
         
-    new_kernels = []
+    MANIFEST_PATH = '/var/cache/module-signing-script/manifest.json'
+    '''Default path of the manifest of signed modules'''
     
-    #Compare kernels and add them to the newKernels list if they are newer than the currently booted one
-    for installed_kernel in installed_kernels:        
-        if compare_kernels (installed_kernel, current_kernel) == 1:
-            new_kernels.append (installed_kernel)
+    RUN_PLAN_PATH = '/var/cache/module-signing-script/plan.json'
+    '''Default path of the plan of the last successful run'''
     
-    return new_kernels
+    JOURNAL_PATH = '/var/cache/module-signing-script/journal.jsonl'
+    '''Default path of the journal of module rewrites'''
     
-def sign_new_kernels (new_kernels: list, module_entries: list, private_key_path: str, public_key_path: str):
-    '''
-        Signs the nvidia kernel modules for every new kernel by calling sign_kernel () on each (void).
-        
-        newKernels (list <str>): A list of the new kernels to sign
-        private_key_path (str): The path to the private key file to sign with
-        public_key_path (str): The path to the public key file to sign with
-    '''
-    
-    for new_kernel in new_kernels:
-        sign_kernel (new_kernel, module_entries, private_key_path, public_key_path)
-    
-def main ():
-    '''
-        Main method for this script (void).
-    '''
-        
-    print ()
-    print ('%s - %s, %s' %(__title__, __copyright__, __license__))
-    print ('Version: %s, %s' %(__version__, __date__))
-    print ('%s' %__host__)
-    print ()
+    FAILED_JOBS_PATH = '/var/cache/module-signing-script/failed-jobs.json'
+    '''Default path of the jobs which failed with --keep-going'''
     
     parser = argparse.ArgumentParser (description = 'Nvidia Signing Script: A small script which signs Nvidia\'s kernel modules for any installed kernel newer than the currently booted one.')
     parser.add_argument ('modules_file', help = '(Mandatory) Your modules JSON file specifying the modules that you want to sign (see README for details)')
     parser.add_argument ('private_key_file', help = '(Mandatory) Your private key file for signing the kernel modules (see README for details)')
     parser.add_argument ('public_key_file', help = '(Mandatory) Your public key file for signing the kernel modules (see README for details)')
+    parser.add_argument ('--key', nargs = 2, action = 'append', metavar = ('PRIVATE_KEY_FILE', 'PUBLIC_KEY_FILE'), help = '(Optional) Another key pair to sign with, can be given several times. Which keys sign a kernel\'s modules is chosen by --key-policy')
+    parser.add_argument ('--hash-algorithm', nargs = '+', choices = HASH_ALGORITHMS, help = '(Optional) Hash algorithms each key signs with, each module is hashed once per algorithm (default: hash_algorithms from the modules JSON file or sha256)')
+    parser.add_argument ('--key-policy', choices = KEY_POLICIES, help = '(Optional) Keys used for each kernel: the first that applies to it (first), the one with the newest certificate (newest) or all of them (all) (default: key_policy from the modules JSON file or first)')
     parser.add_argument ('-k', '--kernels', type = str, nargs = '+', help = '(Optional) Sign the modules only for the provided kernels. Make sure to format them correctly (see uname -r output)')
+    parser.add_argument ('--newest', type = int, metavar = 'N', help = '(Optional) Only build and sign for the newest N of the kernels that would be signed (or verified) and pass the other selection policies')
+    parser.add_argument ('--require-headers', help = '(Optional) Only build and sign for kernels whose kernel headers (a Makefile in the kernel source directory) are installed', action = 'store_true')
+    parser.add_argument ('--match', metavar = 'REGEX', help = '(Optional) Only build and sign for kernels whose release contains a match of the regular expression (Ex: a flavor such as fc40 or -generic$)')
+    parser.add_argument ('--boot-default', help = '(Optional) Only build and sign for the kernel of the default boot entry, read from the grub environment and the BLS entries (as set by grubby) or systemd-boot\'s loader.conf', action = 'store_true')
+    parser.add_argument ('--boot-root', default = BOOT_ROOT, help = '(Optional) Directory with the bootloader configuration read by --boot-default (default: %s)' %BOOT_ROOT)
+    parser.add_argument ('--discovery', choices = ['filesystem', 'package-manager'], default = 'filesystem', help = '(Optional) Find installed kernels by scanning /usr/lib/modules and /usr/src/kernels (filesystem, default) or by querying the package manager (package-manager)')
+    parser.add_argument ('--cross-check', help = '(Optional) Also query the package manager and warn about kernels the two discovery methods disagree on', action = 'store_true')
+    parser.add_argument ('-b', '--backend', choices = ['native', 'sign-file'], default = 'native', help = '(Optional) Sign modules in-process (native, default) or by running the kernel\'s sign-file binary for each module (sign-file)')
+    parser.add_argument ('-j', '--jobs', type = int, default = os.cpu_count () or 1, help = '(Optional) Number of modules to sign at the same time, speeds up sign-file, hashing and compression but not the native backend\'s RSA operation, which holds the interpreter lock (default: the number of CPUs)')
+    parser.add_argument ('--build-jobs', type = int, default = 1, help = '(Optional) Number of kernels to build akmods for at the same time, signing always overlaps with the builds (default: 1)')
+    parser.add_argument ('--build-timeout', type = float, default = 0, help = '(Optional) Seconds an akmods build may take before it is stopped and reported as failed, 0 for no limit (default: 0)')
+    parser.add_argument ('--sign-timeout', type = float, default = 0, help = '(Optional) Seconds a sign-file call may take before it is stopped and reported as failed, 0 for no limit (default: 0)')
+    parser.add_argument ('--modules-root', default = MODULES_ROOT, help = '(Optional) Directory with a modules directory for each installed kernel (default: %s)' %MODULES_ROOT)
+    parser.add_argument ('--kernel-sources-root', default = KERNEL_SOURCES_ROOT, help = '(Optional) Directory with a kernel source directory containing scripts/sign-file for each installed kernel (default: %s)' %KERNEL_SOURCES_ROOT)
+    parser.add_argument ('--akmods-command', default = ' '.join (AKMODS_COMMAND), help = '(Optional) Command used to build the kernel modules, called with --kernels KERNEL --force (default: %s)' %' '.join (AKMODS_COMMAND))
+    parser.add_argument ('-w', '--watch', help = '(Optional) Keep running after signing and sign new kernels and rebuilt modules as soon as they are installed (uses inotify)', action = 'store_true')
+    parser.add_argument ('--watch-debounce', type = float, default = 5.0, help = '(Optional) Seconds without new events to wait for before signing in watch mode (default: 5)')
+    parser.add_argument ('-n', '--dry-run', help = '(Optional) Print the modules that would be signed for each kernel (after expanding patterns) without building or signing anything', action = 'store_true')
+    parser.add_argument ('--verify', help = '(Optional) Check that the modules of the provided kernels (or of every installed kernel in automatic mode) are signed with one of your keys instead of signing them, exits with code 10 if any are not', action = 'store_true')
+    parser.add_argument ('--check-signatures', help = '(Optional) With --verify, also check the signatures cryptographically (reads every module in full)', action = 'store_true')
+    parser.add_argument ('--report', default = '-', help = '(Optional) File to write the JSON --verify report to (default: - for standard output, the other output then goes to standard error)')
+    parser.add_argument ('--elevate-command', default = 'sudo', help = '(Optional) Command used once to start the privileged helper which builds and signs as root, an empty string runs it as the current user (default: sudo, not used when run as root)')
+    parser.add_argument ('--no-helper', help = '(Optional) Don\'t start the privileged helper: call sudo for each akmods and sign-file command and sign in-process with the native backend', action = 'store_true')
+    parser.add_argument ('--keep-going', help = '(Optional) Keep building and signing the other kernels and modules after a failure, retry the failed jobs and list the ones which still fail (exits with the exit code of the first)', action = 'store_true')
+    parser.add_argument ('--retries', type = int, default = 2, help = '(Optional) With --keep-going, times the failed jobs are run again (default: 2)')
+    parser.add_argument ('--retry-delay', type = float, default = 5.0, help = '(Optional) With --keep-going, seconds to wait before the first retry, doubled for each retry after it (default: 5)')
+    parser.add_argument ('--resume', help = '(Optional) Only run the jobs which still failed in the last --keep-going run again (implies --keep-going)', action = 'store_true')
+    parser.add_argument ('--failed-jobs', default = FAILED_JOBS_PATH, help = '(Optional) File the jobs which still fail with --keep-going are saved to for --resume, an empty string disables it (default: %s)' %FAILED_JOBS_PATH)
+    parser.add_argument ('-f', '--force', help = '(Optional) Sign every module even if it is already signed with your key, ignoring the manifest', action = 'store_true')
+    parser.add_argument ('-m', '--manifest', default = MANIFEST_PATH, help = '(Optional) File which records the modules that are signed so unchanged modules can be skipped without reading them, an empty string disables it (default: %s)' %MANIFEST_PATH)
+    parser.add_argument ('--journal', default = JOURNAL_PATH, help = '(Optional) File which records each module rewrite so one interrupted by a crash is finished or undone by the next run, an empty string disables it (default: %s)' %JOURNAL_PATH)
+    parser.add_argument ('--signature-cache', help = '(Optional) Directory to cache module signatures in by the SHA-256 hash of the unsigned module, your key and the hash algorithm. Hosts sharing it (Ex: over NFS) sign each identical module once and copy the signature otherwise')
+    parser.add_argument ('--signature-cache-size', type = int, default = 256, help = '(Optional) MiB the signature cache may hold, the least recently used signatures are removed at the start of a run when it holds more (default: 256)')
+    parser.add_argument ('--plan-cache', default = RUN_PLAN_PATH, help = '(Optional) File which records what the last successful run signed and the state of the system it ran on, a run with the same state exits straight away. An empty string disables it (default: %s)' %RUN_PLAN_PATH)
+    parser.add_argument ('--metrics', help = '(Optional) File to write the time spent in each phase and the counts of signed, skipped and failed modules to when the script exits')
+    parser.add_argument ('--metrics-format', choices = ['json', 'prometheus'], default = 'json', help = '(Optional) Format of the --metrics file: json (default) or prometheus for the node_exporter textfile collector')
     parser.add_argument ('-d', '--debug', help = '(Optional) Display extra print statements for debugging', action = 'store_true')
     args = parser.parse_args ()
     
-    global DEBUG 
-    DEBUG = args.debug
-    
-    module_entries = get_module_entries (args.modules_file)
-    
-    print ('Signing modules for: ', end = '')
-    for module_entry in module_entries:
-        print (module_entry ['name'], end = ', ')
+    #A verify report written to standard output has it to itself so it can be piped into a JSON parser, everything else goes to standard error
+    if args.verify and args.report == '-':
+        sys.stdout = sys.stderr
+        
+    print ()
+    print ('%s - %s, %s' %(__title__, __copyright__, __license__))
+    print ('Version: %s, %s' %(__version__, __date__))
+    print ('%s' %__host__)
     print ()
     
-    #Manual mode (-k/--kernels is present)
-    if args.kernels != None:
-        print ('Running in manual mode')
-        print ()
-        print ('Provided kernels: %s' %args.kernels)
-        print ()
+    if args.newest != None and args.newest < 1:
+        parser.error ('--newest must be at least 1')
         
-        for kernel in args.kernels:
-            kernel_version = extract_kernel_version (kernel) #Will exit if the argument is not a proper version string
+    if args.match != None:
+        try:
+            re.compile (args.match)
             
-            print ('Signing provided kernel: %s' %kernel_version)
-            print ()
+        except (re.error) as pattern_error:
+            parser.error ('--match is not a valid regular expression: %s' %pattern_error)
             
-            sign_kernel (kernel_version, module_entries, args.private_key_file, args.public_key_file)
-        
-        print ('Kernel modules for provided kernel(s) have been signed')
-        print ()
-        
-    #Else automatic mode
-    else:
-        print ('Running in automatic (new kernels) mode')
-        print ()
-        
-        packageManager = get_package_manager ()
-        
-        print ('Found package manager: %s' %packageManager)
-        
-        currentKernel = get_current_kernel ()
-
-        print ('Found current kernel: %s' %currentKernel)
-        
-        installedKernels = get_installed_kernels (packageManager)
-        
-        print ('Found installed kernels: %s' %installedKernels)
-        
-        newKernels = get_new_kernels (currentKernel, installedKernels)
+    DEBUG = args.debug
+    
+    #Checked before anything else so a run with nothing to do doesn't import the signing code, read the keys, discover kernels, elevate or build
+    use_run_plan = args.plan_cache != '' and not (args.force or args.verify or args.dry_run or args.watch or args.resume)
+    
+    if use_run_plan:
+        run_fingerprint = get_run_fingerprint (args)
         
-        if len (newKernels) > 0:
-            print ('Found new kernels: %s' %newKernels)
-            print ()
+        if is_run_plan_current (args.plan_cache, run_fingerprint):
+            print ('Nothing to do, no kernels, modules, packages or inputs have changed since the last run (run plan: %s)' %args.plan_cache)
             
-            sign_new_kernels (newKernels, module_entries, args.private_key_file, args.public_key_file)
-        
-            print ('Kernel modules for new kernels have been signed')
-        
-        else:
-            print ('No new kernels found')
+            #The metrics are written by the signing code, a run with nothing to do only reports how long it took
+            if args.metrics != None:
+                import module_signing
+                
+                module_signing.write_metrics (args.metrics, args.metrics_format, module_signing.collect_metrics (run_start, time.monotonic () - run_clock_start, 0))
+                
+            return
             
+    import module_signing
+    
+    module_signing.main (args, (lambda kernels, module_entries: save_run_plan (args.plan_cache, run_fingerprint, kernels, module_entries)) if use_run_plan else None)
+    
 if __name__ == '__main__':
     main ()
@@ -0,0 +1,224 @@
+#License
+'''
+    MIT License (LICENSE.txt)
+
+    Copyright (c) 2016 Kieran Gillibrand
+'''
+
+#Description
+'''
+    Shared fixtures for the tests of module-signing-script.py
+'''
+
+#Imports
+import sys
+import os
+import subprocess
+import shutil
+import collections
+import json
+import gzip
+import lzma
+
+import importlib
+import importlib.util
+
+import pytest
+
+REPOSITORY_PATH = os.path.dirname (os.path.dirname (os.path.abspath (__file__)))
+'''The directory with the script and its signing code'''
+
+SCRIPT_PATH = os.path.join (REPOSITORY_PATH, 'module-signing-script.py')
+'''The script being tested, which checks the run plan and imports module_signing.py'''
+
+TestKey = collections.namedtuple ('TestKey', ['private_key_path', 'public_key_path', 'certificate_pem_path'])
+'''A throwaway RSA key with its self signed certificate in DER (for the script) and PEM (for openssl cms)'''
+
+@pytest.fixture (scope = 'session')
+def signing_script ():
+    '''
+        Imports module_signing.py, the signing code of the script (module)
+    '''
+
+    sys.path.insert (0, REPOSITORY_PATH)
+
+    return importlib.import_module ('module_signing')
+
+@pytest.fixture (scope = 'session')
+def entry_point ():
+    '''
+        Imports module-signing-script.py (its file name isn't a valid module name) without running it (module)
+    '''
+
+    spec = importlib.util.spec_from_file_location ('module_signing_script', SCRIPT_PATH)
+    entry_point = importlib.util.module_from_spec (spec)
+    spec.loader.exec_module (entry_point)
+
+    return entry_point
+
+def create_test_key (tmp_path_factory, name: str) -> TestKey:
+    '''
+        Creates a throwaway RSA key and self signed certificate with openssl, skips the test if openssl isn't installed (TestKey)
+
+        name (str): The file name of the key files and the common name of the certificate, whose validity starts now
+    '''
+
+    if shutil.which ('openssl') == None:
+        pytest.skip ('openssl is needed to create a test key')
+
+    directory = tmp_path_factory.mktemp ('keys')
+    test_key = TestKey (str (directory / (name + '.priv')), str (directory / (name + '.der')), str (directory / (name + '.pem')))
+
+    subprocess.run (['openssl', 'req', '-new', '-x509', '-newkey', 'rsa:2048', '-nodes', '-days', '1', '-subj', '/CN=Module Signing Script %s' %name, '-keyout', test_key.private_key_path, '-out', test_key.certificate_pem_path], check = True, stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL)
+    subprocess.run (['openssl', 'x509', '-in', test_key.certificate_pem_path, '-outform', 'DER', '-out', test_key.public_key_path], check = True)
+
+    return test_key
+
+@pytest.fixture (scope = 'session')
+def test_key (tmp_path_factory) -> TestKey:
+    '''
+        The key the tests sign with (TestKey)
+    '''
+
+    return create_test_key (tmp_path_factory, 'test')
+
+@pytest.fixture (scope = 'session')
+def other_key (tmp_path_factory) -> TestKey:
+    '''
+        A second key, for modules signed by someone else or a second signer (TestKey)
+    '''
+
+    return create_test_key (tmp_path_factory, 'other')
+
+KERNEL = '999.0.0-1.test.x86_64'
+'''The kernel installed in the tree of the kernel_tree fixture'''
+
+SIGN_FILE_SCRIPT = '''#!%s
+#Stands in for the kernel's sign-file: [-d] HASH_ALGORITHM PRIVATE_KEY PUBLIC_KEY MODULE, -d writes the CMS signature to MODULE.p7s instead of signing the module
+import sys
+import hashlib
+
+sys.path.insert (0, %r)
+
+import module_signing
+
+arguments = sys.argv [1:]
+detached = arguments [0] == '-d'
+hash_algorithm, private_key_path, public_key_path, module_path = arguments [1:] if detached else arguments
+signing_key = module_signing.load_signing_key (private_key_path, public_key_path)
+
+if detached:
+    with open (module_path, 'rb') as module_file:
+        signature = module_signing.create_multi_signer_signature ([(signing_key, hash_algorithm)], {hash_algorithm: hashlib.new (hash_algorithm, module_file.read ()).digest ()})
+
+    with open (module_path + '.p7s', 'wb') as signature_file:
+        signature_file.write (signature [:-module_signing.MODULE_TRAILER_SIZE])
+
+else:
+    module_signing.sign_module_native (module_path, [(module_signing.KeyPair (private_key_path, public_key_path, None, None, signing_key), hash_algorithm)])
+''' %(sys.executable, REPOSITORY_PATH)
+'''A sign-file which signs with the native code, written to the kernel source directory of the kernel_tree fixture'''
+
+KernelTree = collections.namedtuple ('KernelTree', ['root', 'module_paths', 'sign_file_path', 'akmods_log_path', 'arguments'])
+'''
+    A kernel tree in a temporary directory
+
+    root is its directory (pathlib.Path) with a bin directory holding a sudo which runs its command, module_paths the unsigned modules of KERNEL, sign_file_path the kernel's sign-file, akmods_log_path the file the stub akmods logs its arguments to
+    arguments are the script arguments which sign the modules of KERNEL in manual mode as the current user, with the manifest, journal, failed jobs and metrics files inside the tree and no run plan
+'''
+
+def install_kernel (root, kernel: str, module_names: tuple = ('test1.ko', 'test2.ko')) -> list:
+    '''
+        Installs a kernel in a tree: unsigned modules in extra/test of its modules directory and a sign-file which signs with the native code in its kernel source directory, returns the module paths (list <pathlib.Path>)
+
+        root (pathlib.Path): The root of the tree
+        kernel (str): The kernel to install
+        module_names (tuple <str>) (optional): The file names of the modules
+    '''
+
+    module_directory = root / 'modules' / kernel / 'extra' / 'test'
+    module_directory.mkdir (parents = True)
+    module_paths = [module_directory / module_name for module_name in module_names]
+
+    for module_path in module_paths:
+        module_path.write_bytes (os.urandom (64 * 1024))
+
+    sign_file_path = root / 'kernels' / kernel / 'scripts' / 'sign-file'
+    sign_file_path.parent.mkdir (parents = True)
+    sign_file_path.write_text (SIGN_FILE_SCRIPT)
+    sign_file_path.chmod (0o755)
+
+    return module_paths
+
+@pytest.fixture
+def kernel_tree (tmp_path, test_key) -> KernelTree:
+    '''
+        Creates a tree with one installed kernel with two unsigned modules (see install_kernel ()) and a stub akmods which logs its arguments (KernelTree)
+    '''
+
+    module_paths = install_kernel (tmp_path, KERNEL)
+    sign_file_path = tmp_path / 'kernels' / KERNEL / 'scripts' / 'sign-file'
+
+    akmods_log_path = tmp_path / 'akmods.log'
+    akmods_path = tmp_path / 'akmods'
+    akmods_path.write_text ('#!/bin/sh\necho "$@" >> %s\n' %akmods_log_path)
+    akmods_path.chmod (0o755)
+
+    #--no-helper runs akmods and sign-file through sudo, which only has to run them here
+    sudo_path = tmp_path / 'bin' / 'sudo'
+    sudo_path.parent.mkdir ()
+    sudo_path.write_text ('#!/bin/sh\nexec "$@"\n')
+    sudo_path.chmod (0o755)
+
+    modules_file = tmp_path / 'modules.json'
+    modules_file.write_text (json.dumps ({'module_entries': [{'name': 'Test', 'directory': 'extra/test/', 'module_files': ['test*.ko*']}]}))
+
+    arguments = [str (modules_file), test_key.private_key_path, test_key.public_key_path, '-k', KERNEL, '--modules-root', str (tmp_path / 'modules'), '--kernel-sources-root', str (tmp_path / 'kernels'),
+                 '--akmods-command', str (akmods_path), '--elevate-command', '', '--manifest', str (tmp_path / 'manifest.json'), '--journal', str (tmp_path / 'journal'),
+                 '--failed-jobs', str (tmp_path / 'failed.json'), '--plan-cache', '', '--metrics', str (tmp_path / 'metrics.json')]
+
+    return KernelTree (tmp_path, module_paths, sign_file_path, akmods_log_path, arguments)
+
+def run_script (kernel_tree: KernelTree, *arguments: str, exit_code: int = 0) -> str:
+    '''
+        Runs the script on the tree with its arguments and more, checks its exit code and returns its output (str)
+
+        kernel_tree (KernelTree): The tree from the kernel_tree fixture
+        arguments (str): More arguments for the script
+        exit_code (int) (optional): The exit code the script has to exit with
+    '''
+
+    environment = dict (os.environ, PATH = os.pathsep.join ([str (kernel_tree.root / 'bin'), os.environ.get ('PATH', '')]))
+    script_run = subprocess.run ([sys.executable, SCRIPT_PATH] + kernel_tree.arguments + list (arguments), stdout = subprocess.PIPE, stderr = subprocess.STDOUT, universal_newlines = True, timeout = 120, env = environment)
+
+    assert script_run.returncode == exit_code, script_run.stdout
+
+    return script_run.stdout
+
+def is_signed (module_path: str) -> bool:
+    '''
+        Returns whether a module ends with the module signature magic string, compressed modules are decompressed first (bool)
+
+        module_path (str): The path of the module
+    '''
+
+    with open (str (module_path), 'rb') as module_file:
+        module_data = module_file.read ()
+
+    if str (module_path).endswith ('.gz'):
+        module_data = gzip.decompress (module_data)
+
+    elif str (module_path).endswith ('.xz'):
+        module_data = lzma.decompress (module_data)
+
+    return module_data.endswith (b'~Module signature appended~\n')
+
+def read_metrics (kernel_tree: KernelTree) -> dict:
+    '''
+        Returns the JSON metrics the last run of the script on the tree wrote (dict)
+
+        kernel_tree (KernelTree): The tree from the kernel_tree fixture
+    '''
+
+    with open (str (kernel_tree.root / 'metrics.json')) as metrics_file:
+        return json.load (metrics_file)
@@ -0,0 +1,103 @@
+#License
+'''
+    MIT License (LICENSE.txt)
+
+    Copyright (c) 2016 Kieran Gillibrand
+'''
+
+#Description
+'''
+    Checks that commands run on the shared event loop report missing commands and bounded output, are limited in number, and that commands which take longer than their timeout are stopped and reported as failed, without being detached from the terminal sudo prompts on
+'''
+
+#Imports
+import sys
+import os
+import time
+import asyncio
+
+import pytest
+
+from conftest import KernelTree, run_script, is_signed
+
+def test_missing_command_returns_127 (signing_script, tmp_path):
+    '''
+        A command which doesn't exist is reported with exit status 127 instead of raising (void)
+    '''
+
+    command_result = signing_script.run_command ([str (tmp_path / 'missing-command')])
+
+    assert command_result.exit_status == 127 and not command_result.timed_out
+    assert 'missing-command' in command_result.output_tail
+
+def test_output_tail_is_bounded (signing_script):
+    '''
+        Only the end of each output stream is kept for error messages, the full stdout only when it is requested (void)
+    '''
+
+    command = [sys.executable, '-c', 'import sys; sys.stdout.write ("a" * 100000 + "end of stdout"); sys.stderr.write ("b" * 100000 + "end of stderr")']
+
+    command_result = signing_script.run_command (command)
+
+    assert command_result.exit_status == 0 and command_result.output == ''
+    stdout_tail, stderr_tail = command_result.output_tail.split ('\n')
+    assert len (stdout_tail) == len (stderr_tail) == signing_script.OUTPUT_TAIL_SIZE
+    assert stdout_tail.endswith ('end of stdout') and stderr_tail.endswith ('end of stderr')
+
+    command_result = signing_script.run_command (command, keep_output = True)
+
+    assert command_result.output == 'a' * 100000 + 'end of stdout'
+
+def test_commands_wait_for_their_turn (signing_script):
+    '''
+        No more commands run at once than the semaphore allows, the others wait for a running one to finish (void)
+    '''
+
+    async def run_commands () -> float:
+        semaphore = asyncio.Semaphore (2)
+        command_start = time.monotonic ()
+
+        command_results = await asyncio.gather (*(signing_script.run_command_async (['sleep', '0.5'], None, False, semaphore) for _ in range (4)))
+
+        assert all (command_result.exit_status == 0 for command_result in command_results)
+
+        return time.monotonic () - command_start
+
+    assert asyncio.run (run_commands ()) >= 1.0
+
+def test_command_is_stopped_after_timeout (signing_script):
+    '''
+        A command still running after its timeout is stopped and reported with exit status 124 (void)
+    '''
+
+    command_start = time.monotonic ()
+    command_result = signing_script.run_command (['sleep', '30'], 0.5)
+
+    assert command_result.timed_out and command_result.exit_status == 124
+    assert 'Timed out after 0.5 seconds' in command_result.output_tail
+    assert time.monotonic () - command_start < 10
+
+def test_command_with_timeout_keeps_session (signing_script):
+    '''
+        A command with a timeout runs in the session of the script, so sudo can still prompt on its terminal (void)
+    '''
+
+    command_result = signing_script.run_command ([sys.executable, '-c', 'import os; print (os.getsid (0))'], 30, keep_output = True)
+
+    assert command_result.exit_status == 0 and not command_result.timed_out
+    assert int (command_result.output) == os.getsid (0)
+
+@pytest.mark.parametrize ('helper_arguments', [[], ['--no-helper']])
+def test_sign_file_timeout_fails_module (kernel_tree: KernelTree, helper_arguments: list):
+    '''
+        A sign-file call which hangs is stopped after --sign-timeout and its module reported as failed, with or without the privileged helper (void)
+    '''
+
+    kernel_tree.sign_file_path.write_text ('#!/bin/sh\nsleep 30\n')
+
+    run_start = time.monotonic ()
+    output = run_script (kernel_tree, '--backend', 'sign-file', '--sign-timeout', '1', '-j', '1', *helper_arguments, exit_code = 2)
+
+    assert 'Timed out after 1 seconds' in output
+    assert time.monotonic () - run_start < 20
+    assert not any (is_signed (module_path) for module_path in kernel_tree.module_paths)
@@ -0,0 +1,103 @@
+#License
+'''
+    MIT License (LICENSE.txt)
+
+    Copyright (c) 2016 Kieran Gillibrand
+'''
+
+#Description
+'''
+    Checks that modules already signed with our key are skipped, from the manifest while they are unchanged and from their signature otherwise, and that --force signs them anyway
+'''
+
+#Imports
+import os
+import json
+
+import pytest
+
+from conftest import KernelTree, run_script, read_metrics, is_signed
+
+def sign_with (signing_script, module_path, key):
+    '''
+        Signs a module with a key in-process, as if something else had signed it (void)
+
+        module_path (pathlib.Path): The module to sign
+        key (TestKey): The key to sign with
+    '''
+
+    signing_key = signing_script.load_signing_key (key.private_key_path, key.public_key_path)
+    signing_script.sign_module_native (str (module_path), [(signing_script.KeyPair (key.private_key_path, key.public_key_path, None, None, signing_key), 'sha256')])
+
+def get_module_counters (kernel_tree: KernelTree) -> tuple:
+    '''
+        Returns the number of modules the last run signed and skipped (tuple (int, int))
+
+        kernel_tree (KernelTree): The tree the script ran on
+    '''
+
+    counters = read_metrics (kernel_tree) ['counters']
+
+    return (counters ['modules_signed'], counters ['modules_skipped'])
+
+def test_second_run_skips_signed_modules (kernel_tree: KernelTree):
+    '''
+        A second run skips every module the first one signed and leaves the files alone, and the manifest records them (void)
+    '''
+
+    run_script (kernel_tree)
+    assert get_module_counters (kernel_tree) == (2, 0)
+
+    module_stats = [os.stat (str (module_path)) for module_path in kernel_tree.module_paths]
+    manifest = json.loads ((kernel_tree.root / 'manifest.json').read_text ()) ['modules']
+
+    assert sorted (manifest) == sorted (str (module_path) for module_path in kernel_tree.module_paths)
+    assert all (manifest [str (module_path)] ['mtime_ns'] == module_stat.st_mtime_ns for module_path, module_stat in zip (kernel_tree.module_paths, module_stats))
+
+    run_script (kernel_tree)
+    assert get_module_counters (kernel_tree) == (0, 2)
+
+    assert [(module_stat.st_ino, module_stat.st_mtime_ns) for module_stat in module_stats] == [(module_stat.st_ino, module_stat.st_mtime_ns) for module_stat in (os.stat (str (module_path)) for module_path in kernel_tree.module_paths)]
+
+def test_unchanged_module_is_skipped_from_manifest (kernel_tree: KernelTree):
+    '''
+        A module whose size and modification time match its manifest entry isn't read, --force signs it anyway (void)
+    '''
+
+    run_script (kernel_tree)
+
+    #Unsigned contents of the same size and with the same modification time can only be told apart by reading the module
+    module_path = kernel_tree.module_paths [0]
+    module_stat = os.stat (str (module_path))
+    module_path.write_bytes (os.urandom (module_stat.st_size))
+    os.utime (str (module_path), ns = (module_stat.st_atime_ns, module_stat.st_mtime_ns))
+
+    run_script (kernel_tree)
+    assert get_module_counters (kernel_tree) == (0, 2)
+    assert not is_signed (module_path)
+
+    run_script (kernel_tree, '--force')
+    assert get_module_counters (kernel_tree) == (2, 0)
+    assert is_signed (module_path)
+
+@pytest.mark.parametrize ('manifest_arguments', [[], ['--manifest', '']])
+def test_changed_module_is_checked_from_its_signature (signing_script, kernel_tree: KernelTree, test_key, other_key, manifest_arguments: list):
+    '''
+        Modules which changed since the manifest entry (or without a manifest) are skipped if their signature is ours and signed otherwise (void)
+    '''
+
+    run_script (kernel_tree, *manifest_arguments)
+
+    #Signed again with our key (a newer signature) and rebuilt then signed by someone else
+    sign_with (signing_script, kernel_tree.module_paths [0], test_key)
+
+    kernel_tree.module_paths [1].write_bytes (os.urandom (64 * 1024))
+    sign_with (signing_script, kernel_tree.module_paths [1], other_key)
+
+    run_script (kernel_tree, *manifest_arguments)
+    assert get_module_counters (kernel_tree) == (1, 1)
+
+    module_signature = signing_script.read_module_signature (str (kernel_tree.module_paths [1]))
+    certificate = signing_script.load_certificate (test_key.public_key_path)
+
+    assert [signer.signer_id in certificate.signer_ids for signer in module_signature.signers] == [True]
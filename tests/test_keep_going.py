@@ -0,0 +1,125 @@
+#License
+'''
+    MIT License (LICENSE.txt)
+
+    Copyright (c) 2016 Kieran Gillibrand
+'''
+
+#Description
+'''
+    Checks that --keep-going signs the other modules after a failure, retries the failed jobs and saves the ones which still fail, and that --resume runs only them again
+'''
+
+#Imports
+import json
+
+from conftest import KERNEL, SIGN_FILE_SCRIPT, KernelTree, run_script, read_metrics, is_signed
+
+FAILING_SIGN_FILE = '#!/bin/sh\ncase "$5" in\n  *test1.ko) echo cannot sign test1.ko; exit 1;;\nesac\nexec %s "$@"\n'
+'''A sign-file which fails for test1.ko and runs the real sign-file (its path is formatted in) for every other module'''
+
+def break_test1 (kernel_tree: KernelTree):
+    '''
+        Keeps the tree's sign-file as sign-file.real and replaces it with FAILING_SIGN_FILE (void)
+
+        kernel_tree (KernelTree): The tree from the kernel_tree fixture
+    '''
+
+    real_sign_file_path = kernel_tree.sign_file_path.with_name ('sign-file.real')
+    real_sign_file_path.write_text (SIGN_FILE_SCRIPT)
+    real_sign_file_path.chmod (0o755)
+
+    kernel_tree.sign_file_path.write_text (FAILING_SIGN_FILE %real_sign_file_path)
+
+def test_failed_module_is_retried_and_saved (kernel_tree: KernelTree):
+    '''
+        The other module is signed, the failed one is retried without building again, listed in the summary and saved to the failed jobs file (void)
+    '''
+
+    break_test1 (kernel_tree)
+
+    output = run_script (kernel_tree, '--backend', 'sign-file', '--keep-going', '--retries', '1', '--retry-delay', '0', exit_code = 2)
+    metrics = read_metrics (kernel_tree)
+
+    assert not is_signed (kernel_tree.module_paths [0]) and is_signed (kernel_tree.module_paths [1])
+    assert 'Retrying 1 failed job(s) in 0.0 seconds (retry 1 of 1)' in output
+    assert '%-40s %8d %8d %8d' %(KERNEL, 1, 0, 1) in output
+    assert 'Exit code 2 (Unable to sign a kernel module): %s' %kernel_tree.module_paths [0] in output
+    assert '1 job(s) still failed after 1 retries, run again with --resume to retry only them' in output
+    assert metrics ['counters'] ['jobs_retried'] == 1 and metrics ['exit_status'] == 2
+    assert kernel_tree.akmods_log_path.read_text () == '--kernels %s --force\n' %KERNEL
+
+    failed_jobs = json.loads ((kernel_tree.root / 'failed.json').read_text ())
+
+    assert failed_jobs ['jobs'] == [{'kernel': KERNEL, 'module': str (kernel_tree.module_paths [0]), 'exit_code': 2}]
+
+def test_resume_runs_only_the_failed_jobs (kernel_tree: KernelTree):
+    '''
+        --resume signs only the saved module, without building akmods, and removes the failed jobs file once it succeeds (void)
+    '''
+
+    break_test1 (kernel_tree)
+    run_script (kernel_tree, '--backend', 'sign-file', '--keep-going', '--retries', '0', exit_code = 2)
+
+    output = run_script (kernel_tree, '--resume', '--dry-run')
+
+    assert 'Kernel %s: %s' %(KERNEL, kernel_tree.module_paths [0]) in output
+    assert not is_signed (kernel_tree.module_paths [0])
+
+    kernel_tree.sign_file_path.write_text (SIGN_FILE_SCRIPT)
+    kernel_tree.akmods_log_path.unlink ()
+
+    output = run_script (kernel_tree, '--backend', 'sign-file', '--resume')
+    metrics = read_metrics (kernel_tree)
+
+    assert 'Resuming 1 failed job(s) from: %s' %(kernel_tree.root / 'failed.json') in output
+    assert all (is_signed (module_path) for module_path in kernel_tree.module_paths)
+    assert metrics ['counters'] ['modules_signed'] == 1
+    assert not kernel_tree.akmods_log_path.exists ()
+    assert not (kernel_tree.root / 'failed.json').exists ()
+
+def test_job_which_succeeds_on_retry (kernel_tree: KernelTree):
+    '''
+        A job which only fails the first time succeeds when it is retried, so the run succeeds and nothing is saved (void)
+    '''
+
+    attempt_path = kernel_tree.root / 'attempted'
+    break_test1 (kernel_tree)
+    kernel_tree.sign_file_path.write_text ('#!/bin/sh\nif [ ! -e %s ]; then touch %s; exit 1; fi\nexec %s "$@"\n' %(attempt_path, attempt_path, kernel_tree.sign_file_path.with_name ('sign-file.real')))
+
+    output = run_script (kernel_tree, '--backend', 'sign-file', '--keep-going', '--retry-delay', '0', '-j', '1')
+    metrics = read_metrics (kernel_tree)
+
+    assert all (is_signed (module_path) for module_path in kernel_tree.module_paths)
+    assert '%-40s %8d %8d %8d' %(KERNEL, 2, 0, 0) in output
+    assert metrics ['counters'] ['jobs_retried'] == 1
+    assert not (kernel_tree.root / 'failed.json').exists ()
+
+def test_failed_build_is_resumed_with_a_build (kernel_tree: KernelTree):
+    '''
+        A kernel whose akmods build failed is saved without a module and built again by --resume (void)
+    '''
+
+    (kernel_tree.root / 'akmods').write_text ('#!/bin/sh\necho akmods failed\nexit 1\n')
+
+    output = run_script (kernel_tree, '--keep-going', '--retries', '0', exit_code = 7)
+
+    assert '%-40s %8d %8d %8d' %(KERNEL, 0, 0, 1) in output
+    assert not any (is_signed (module_path) for module_path in kernel_tree.module_paths)
+
+    output = run_script (kernel_tree, '--resume', '--dry-run')
+
+    assert 'Kernel %s: build and sign every module' %KERNEL in output
+
+def test_retry_plan (signing_script):
+    '''
+        Failed builds are built again, failed modules directories sign every module and otherwise only the failed modules are signed, in kernel order (void)
+    '''
+
+    def failed (kernel: str, module_path: str, exit_code: int):
+        return signing_script.FailedJob (kernel, module_path, signing_script.JobFailure ('', exit_code, None, 0))
+
+    failed_jobs = [failed ('6.10.0-1.fc40.x86_64', '/modules/a.ko', 2), failed ('6.10.0-1.fc40.x86_64', '/modules/b.ko', 2), failed ('6.9.0-1.fc40.x86_64', None, 7),
+                   failed ('6.11.0-1.fc40.x86_64', '/modules/c.ko', 2), failed ('6.11.0-1.fc40.x86_64', None, 6), failed ('6.11.0-1.fc40.x86_64', '/modules/d.ko', 2)]
+
+    assert signing_script.get_retry_plan (failed_jobs) == [('6.9.0-1.fc40.x86_64', True, None), ('6.10.0-1.fc40.x86_64', False, {'/modules/a.ko', '/modules/b.ko'}), ('6.11.0-1.fc40.x86_64', False, None)]
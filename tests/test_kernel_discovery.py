@@ -0,0 +1,89 @@
+#License
+'''
+    MIT License (LICENSE.txt)
+
+    Copyright (c) 2016 Kieran Gillibrand
+'''
+
+#Description
+'''
+    Checks that installed kernels are found by scanning the kernel directories without starting a process, and that the package manager lists used by --cross-check are parsed
+'''
+
+#Imports
+import os
+
+import pytest
+
+from conftest import KERNEL, KernelTree, install_kernel, run_script, is_signed
+
+def no_command (command: list, *arguments, **keyword_arguments):
+    '''
+        Stands in for run_command () where discovery must not start a process (void)
+    '''
+
+    raise AssertionError ('Started a process: %s' %command)
+
+def test_installed_kernels_are_found_on_the_filesystem (signing_script, tmp_path, monkeypatch):
+    '''
+        Only kernels with both a modules directory and a kernel source directory with scripts/sign-file are found, oldest first (void)
+    '''
+
+    for kernel in ('6.10.0-1.fc40.x86_64', '6.9.12-200.fc40.x86_64', '6.10.0-10.fc40.x86_64'):
+        install_kernel (tmp_path, kernel)
+
+    (tmp_path / 'modules' / '6.8.0-1.fc40.x86_64').mkdir ()
+    (tmp_path / 'kernels' / '6.7.0-1.fc40.x86_64').mkdir ()
+    (tmp_path / 'modules' / '6.6.0-1.fc40.x86_64').mkdir ()
+    (tmp_path / 'kernels' / '6.6.0-1.fc40.x86_64' / 'scripts').mkdir (parents = True)
+    (tmp_path / 'modules' / 'modules.conf').write_text ('')
+
+    monkeypatch.setattr (signing_script, 'MODULES_ROOT', str (tmp_path / 'modules'))
+    monkeypatch.setattr (signing_script, 'KERNEL_SOURCES_ROOT', str (tmp_path / 'kernels'))
+    monkeypatch.setattr (signing_script, 'run_command', no_command)
+
+    assert signing_script.find_installed_kernels () == ['6.9.12-200.fc40.x86_64', '6.10.0-1.fc40.x86_64', '6.10.0-10.fc40.x86_64']
+    assert signing_script.get_current_kernel () == os.uname ().release
+
+def test_missing_kernel_directories_find_no_kernels (signing_script, tmp_path, monkeypatch):
+    '''
+        Kernel directories which don't exist find no kernels instead of failing (void)
+    '''
+
+    monkeypatch.setattr (signing_script, 'MODULES_ROOT', str (tmp_path / 'modules'))
+    monkeypatch.setattr (signing_script, 'KERNEL_SOURCES_ROOT', str (tmp_path / 'kernels'))
+
+    assert signing_script.find_installed_kernels () == []
+
+@pytest.mark.parametrize ('package_manager, output, kernels', [
+    ('rpm', 'kernel-6.9.12-200.fc40.x86_64\nkernel-6.10.0-1.fc40.x86_64\n', ['6.9.12-200.fc40.x86_64', '6.10.0-1.fc40.x86_64']),
+    ('dpkg', 'ii  linux-image-6.8.0-45-generic  6.8.0-45.45  amd64  Signed kernel image generic\nii  linux-image-generic  6.8.0.45.45  amd64  Generic Linux kernel image\nrc  linux-image-6.8.0-40-generic  6.8.0-40.40  amd64  Signed kernel image generic\nii  vim  2:9.1  amd64  Vi IMproved\n', ['6.8.0-45-generic']),
+    ('pacman', 'bash 5.2.032-1\nlinux 6.10.10.arch1-1\nlinux-headers 6.10.10.arch1-1\n', ['6.10.10-arch1-1'])])
+def test_package_manager_lists_are_parsed (signing_script, monkeypatch, package_manager: str, output: str, kernels: list):
+    '''
+        The installed kernels are read from the package list of each package manager without a shell pipeline (void)
+    '''
+
+    def list_packages (command: list, timeout: float = None, keep_output: bool = False):
+        assert '|' not in command
+
+        return signing_script.CommandResult (command, 0, 0.0, output, '', False)
+
+    monkeypatch.setattr (signing_script, 'run_command', list_packages)
+
+    assert signing_script.get_installed_kernels (package_manager) == kernels
+
+def test_automatic_mode_signs_kernels_found_on_the_filesystem (kernel_tree: KernelTree):
+    '''
+        Without -k the kernels found on the filesystem which are newer than the booted one are built and signed (void)
+    '''
+
+    arguments = list (kernel_tree.arguments)
+    kernel_index = arguments.index ('-k')
+    del arguments [kernel_index:kernel_index + 2]
+
+    output = run_script (kernel_tree._replace (arguments = arguments), '--discovery', 'filesystem')
+
+    assert 'Kernel %s: signed 2 module(s)' %KERNEL in output
+    assert all (is_signed (module_path) for module_path in kernel_tree.module_paths)
+    assert kernel_tree.akmods_log_path.read_text () == '--kernels %s --force\n' %KERNEL
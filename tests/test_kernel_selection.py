@@ -0,0 +1,153 @@
+#License
+'''
+    MIT License (LICENSE.txt)
+
+    Copyright (c) 2016 Kieran Gillibrand
+'''
+
+#Description
+'''
+    Checks that the selection policies (--newest, --require-headers, --match and --boot-default) narrow the kernels down before akmods builds for them, reading the default boot entry from the bootloader files
+'''
+
+#Imports
+import pytest
+
+from conftest import KERNEL, KernelTree, install_kernel, run_script, is_signed
+
+KERNELS = ['6.9.12-200.fc40.x86_64', '6.10.0-1.fc40.x86_64+debug', '6.10.0-1.fc40.x86_64', '6.10.0-10.fc40.x86_64', '6.8.0-1.fc39.x86_64']
+'''Candidate kernels, not in order'''
+
+def select (signing_script, newest: int = None, require_headers: bool = False, pattern: str = None, boot_default: bool = False) -> list:
+    '''
+        Selects from KERNELS, with one of them given twice, with the given policies (list <str>)
+
+        newest (int) (optional): Keep only the newest N kernels
+        require_headers (bool) (optional): Keep only the kernels with a Makefile in their kernel source directory
+        pattern (str) (optional): Keep only the kernels with a match of the regular expression
+        boot_default (bool) (optional): Keep only the kernel of the default boot entry
+    '''
+
+    return signing_script.select_kernels (KERNELS + KERNELS [:1], signing_script.KernelSelection (newest, require_headers, pattern, boot_default))
+
+@pytest.fixture
+def boot_root (signing_script, tmp_path, monkeypatch):
+    '''
+        Points the bootloader files read by --boot-default at an empty directory in the tree (pathlib.Path)
+    '''
+
+    monkeypatch.setattr (signing_script, 'BOOT_ROOT', str (tmp_path / 'boot'))
+
+    return tmp_path / 'boot'
+
+def write_boot_entries (boot_root, *kernels: str):
+    '''
+        Writes a BLS entry for each kernel like kernel-install does, every other one without a version field (void)
+
+        boot_root (pathlib.Path): The directory from the boot_root fixture
+        kernels (str): The kernels to write entries for
+    '''
+
+    entries_directory = boot_root / 'loader' / 'entries'
+    entries_directory.mkdir (parents = True)
+
+    for entry_number, kernel in enumerate (kernels):
+        version_line = 'version %s\n' %kernel if entry_number % 2 == 0 else ''
+        (entries_directory / ('0123456789abcdef-%s.conf' %kernel)).write_text ('title Fedora Linux (%s)\n%slinux /vmlinuz-%s\noptions root=/dev/sda1\n' %(kernel, version_line, kernel))
+
+def test_every_kernel_without_policies (signing_script):
+    '''
+        Without a policy the kernels are returned unchanged (void)
+    '''
+
+    assert select (signing_script) == KERNELS + KERNELS [:1]
+
+def test_newest_kernels_are_selected (signing_script):
+    '''
+        --newest keeps the newest kernels, oldest first and once each (void)
+    '''
+
+    assert select (signing_script, newest = 2) == ['6.10.0-1.fc40.x86_64+debug', '6.10.0-10.fc40.x86_64']
+
+def test_newest_applies_after_the_other_policies (signing_script):
+    '''
+        --newest counts only the kernels which pass the other policies (void)
+    '''
+
+    assert select (signing_script, newest = 2, pattern = r'fc40\.x86_64$') == ['6.10.0-1.fc40.x86_64', '6.10.0-10.fc40.x86_64']
+    assert select (signing_script, pattern = r'\+debug') == ['6.10.0-1.fc40.x86_64+debug']
+
+def test_kernels_without_headers_are_left_out (signing_script, tmp_path, monkeypatch):
+    '''
+        --require-headers keeps only the kernels with a Makefile in their kernel source directory (void)
+    '''
+
+    for kernel in ('6.9.12-200.fc40.x86_64', '6.8.0-1.fc39.x86_64'):
+        (tmp_path / kernel).mkdir ()
+        (tmp_path / kernel / 'Makefile').write_text ('')
+
+    (tmp_path / '6.10.0-10.fc40.x86_64').mkdir ()
+
+    monkeypatch.setattr (signing_script, 'KERNEL_SOURCES_ROOT', str (tmp_path))
+
+    assert select (signing_script, require_headers = True) == ['6.8.0-1.fc39.x86_64', '6.9.12-200.fc40.x86_64']
+
+@pytest.mark.parametrize ('grub_environment, loader_conf, boot_kernel', [
+    (None, None, '6.10.0-10.fc40.x86_64'),
+    ('saved_entry=0123456789abcdef-6.9.12-200.fc40.x86_64\n', None, '6.9.12-200.fc40.x86_64'),
+    ('saved_entry=0123456789abcdef-6.9.12-200.fc40.x86_64\nnext_entry=0123456789abcdef-6.10.0-1.fc40.x86_64\n', None, '6.10.0-1.fc40.x86_64'),
+    ('saved_entry=1\n', None, '6.10.0-1.fc40.x86_64'),
+    ('saved_entry=Fedora Linux (6.9.12-200.fc40.x86_64)\n', None, '6.9.12-200.fc40.x86_64'),
+    (None, 'timeout 3\ndefault 0123456789abcdef-6.9.*\n', '6.9.12-200.fc40.x86_64')])
+def test_default_boot_entry_is_read (signing_script, boot_root, grub_environment: str, loader_conf: str, boot_kernel: str):
+    '''
+        The default boot entry is the one time or saved grub entry (an entry id, a menu index or a title naming the kernel), the loader.conf default or the newest kernel (void)
+    '''
+
+    write_boot_entries (boot_root, '6.9.12-200.fc40.x86_64', '6.10.0-1.fc40.x86_64', '6.10.0-10.fc40.x86_64')
+
+    if grub_environment != None:
+        (boot_root / 'grub2').mkdir ()
+        (boot_root / 'grub2' / 'grubenv').write_text ('# GRUB Environment Block\n' + grub_environment + '#' * 512)
+
+    if loader_conf != None:
+        (boot_root / 'loader' / 'loader.conf').write_text (loader_conf)
+
+    assert signing_script.get_default_boot_kernel (sorted (KERNELS, key = signing_script.kernel_sort_key)) == boot_kernel
+    assert select (signing_script, boot_default = True) == [boot_kernel]
+
+def test_grub_menu_without_boot_entries (signing_script, boot_root):
+    '''
+        Without BLS entries a saved menu index or title is looked up in the installed kernels, newest first like grub's menu (void)
+    '''
+
+    (boot_root / 'grub').mkdir (parents = True)
+    (boot_root / 'grub' / 'grubenv').write_text ('saved_entry=Advanced options for Fedora>Fedora, with Linux 6.10.0-1.fc40.x86_64\n')
+
+    assert select (signing_script, boot_default = True) == ['6.10.0-1.fc40.x86_64']
+
+    (boot_root / 'grub' / 'grubenv').write_text ('saved_entry=2\n')
+
+    assert select (signing_script, boot_default = True) == ['6.10.0-1.fc40.x86_64']
+
+def test_missing_bootloader_selects_no_kernels (signing_script, boot_root, capsys):
+    '''
+        Without bootloader files no kernel is the default, which is reported instead of failing (void)
+    '''
+
+    assert select (signing_script, boot_default = True) == []
+    assert 'the default boot entry could not be found in %s' %boot_root in capsys.readouterr ().out
+
+def test_left_out_kernels_are_not_built (kernel_tree: KernelTree):
+    '''
+        Kernels left out by the selection policies are neither built nor signed (void)
+    '''
+
+    old_module_paths = install_kernel (kernel_tree.root, '998.0.0-1.test.x86_64')
+
+    output = run_script (kernel_tree, '-k', '998.0.0-1.test.x86_64', KERNEL, '--newest', '1')
+
+    assert "Selected kernels: ['%s'] (1 left out by the selection policies)" %KERNEL in output
+    assert all (is_signed (module_path) for module_path in kernel_tree.module_paths)
+    assert not any (is_signed (module_path) for module_path in old_module_paths)
+    assert kernel_tree.akmods_log_path.read_text () == '--kernels %s --force\n' %KERNEL
@@ -0,0 +1,79 @@
+#License
+'''
+    MIT License (LICENSE.txt)
+
+    Copyright (c) 2016 Kieran Gillibrand
+'''
+
+#Description
+'''
+    Checks kernel_sort_key () against known orderings of kernel releases and measures how long sorting them takes
+'''
+
+#Imports
+import random
+import time
+
+import pytest
+
+KNOWN_ORDERINGS = [
+    #Fedora
+    ('4.7.2-200.fc24.x86_64', '4.7.2-201.fc24.x86_64'),
+    ('4.5.5-300.fc24.x86_64', '4.7.2-200.fc24.x86_64'),
+    ('4.9.9-200.fc25.x86_64', '4.10.1-200.fc25.x86_64'),
+    ('6.5.12-300.fc39.x86_64', '6.6.2-201.fc39.x86_64'),
+    ('6.6.2-201.fc38.x86_64', '6.6.2-201.fc39.x86_64'),
+    ('4.5.5.fc24.x86_64', '4.7.2-200.fc24.x86_64'),
+    #Release candidates come before the final release
+    ('5.4.0-rc3', '5.4.0'),
+    ('5.4.0-rc3', '5.4.0-rc10'),
+    ('6.7.0-0.rc8.61.fc40.x86_64', '6.7.0-61.fc40.x86_64'),
+    ('5.3.18', '5.4.0-rc1'),
+    #Debian and Ubuntu
+    ('5.15.0-91-generic', '5.15.0-101-generic'),
+    ('5.15.0-101-generic', '6.2.0-39-generic'),
+    ('6.1.0-13-amd64', '6.1.0-17-amd64'),
+    #Arch
+    ('6.6.7-arch1-1', '6.6.7-arch1-2'),
+    ('6.6.7-arch1-2', '6.6.7-arch2-1'),
+    ('6.6.9-arch1-1', '6.6.10-arch1-1'),
+    #A number is newer than letters, like rpm
+    ('4.7.2-200.fc24', '4.7.2-200.1'),
+]
+'''Pairs of kernel releases, the first is older than the second'''
+
+@pytest.mark.parametrize ('older, newer', KNOWN_ORDERINGS)
+def test_known_ordering (signing_script, older: str, newer: str):
+    '''
+        Each pair sorts oldest first and a release is equal to itself (void)
+    '''
+
+    assert signing_script.kernel_sort_key (older) < signing_script.kernel_sort_key (newer)
+    assert signing_script.kernel_sort_key (older) == signing_script.kernel_sort_key (older)
+
+def test_sorted_table (signing_script):
+    '''
+        Sorting the releases of the table in a random order gives an order consistent with every pair (void)
+    '''
+
+    kernels = sorted ({kernel for pair in KNOWN_ORDERINGS for kernel in pair})
+    random.Random (0).shuffle (kernels)
+    positions = {kernel: position for position, kernel in enumerate (sorted (kernels, key = signing_script.kernel_sort_key))}
+
+    assert all (positions [older] < positions [newer] for older, newer in KNOWN_ORDERINGS)
+
+def test_sort_benchmark (signing_script):
+    '''
+        Sorting 500 releases with an empty key cache takes a few milliseconds, the limit only catches a pathological regression (void)
+    '''
+
+    generator = random.Random (0)
+    kernels = ['%d.%d.%d-%d.fc%d.x86_64' %(generator.randint (3, 6), generator.randint (0, 20), generator.randint (0, 20), generator.randint (100, 300), generator.randint (24, 40)) for _ in range (500)]
+
+    signing_script.kernel_sort_key.cache_clear ()
+
+    sort_start = time.perf_counter ()
+    sorted (kernels, key = signing_script.kernel_sort_key)
+    sort_seconds = time.perf_counter () - sort_start
+
+    assert sort_seconds < 0.5, 'Sorted %d kernels in %.2f ms' %(len (kernels), sort_seconds * 1000)
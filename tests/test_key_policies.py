@@ -0,0 +1,114 @@
+#License
+'''
+    MIT License (LICENSE.txt)
+
+    Copyright (c) 2016 Kieran Gillibrand
+'''
+
+#Description
+'''
+    Checks that the key policies (first, newest and all) choose which of several key pairs sign a kernel's modules, with the JSON keys whose kernels match coming first
+'''
+
+#Imports
+import json
+import time
+
+import pytest
+
+from conftest import KernelTree, create_test_key, run_script
+
+@pytest.fixture (scope = 'module')
+def newer_key (tmp_path_factory, test_key, other_key):
+    '''
+        A key whose certificate became valid after the ones of test_key and other_key (TestKey)
+    '''
+
+    #Certificate validity is stored in whole seconds
+    time.sleep (1.1)
+
+    return create_test_key (tmp_path_factory, 'newer')
+
+def get_signing_keys (signing_script, kernel_tree: KernelTree, *test_keys) -> list:
+    '''
+        Returns the names of the keys each module of the tree is signed with, sorted by name (list <list <str>>)
+
+        kernel_tree (KernelTree): The tree from the kernel_tree fixture
+        test_keys (TestKey): The keys the modules can be signed with
+    '''
+
+    certificates = {test_key.public_key_path.rsplit ('/', 1) [-1] [:-len ('.der')]: signing_script.load_certificate (test_key.public_key_path) for test_key in test_keys}
+
+    return [sorted (name for signer in signing_script.read_module_signature (str (module_path)).signers for name, certificate in certificates.items () if signer.signer_id in certificate.signer_ids) for module_path in kernel_tree.module_paths]
+
+def write_json_keys (kernel_tree: KernelTree, keys: list, key_policy: str = None):
+    '''
+        Adds keys (and a key policy) to the modules JSON file of the tree (void)
+
+        kernel_tree (KernelTree): The tree from the kernel_tree fixture
+        keys (list <tuple (TestKey, list)>): The keys with the kernel patterns they are used for, None for every kernel
+        key_policy (str) (optional): The key_policy of the file
+    '''
+
+    modules_path = kernel_tree.root / 'modules.json'
+    modules = json.loads (modules_path.read_text ())
+    modules ['keys'] = [{'private_key': test_key.private_key_path, 'public_key': test_key.public_key_path, **({'kernels': kernels} if kernels != None else {})} for test_key, kernels in keys]
+
+    if key_policy != None:
+        modules ['key_policy'] = key_policy
+
+    modules_path.write_text (json.dumps (modules))
+
+@pytest.mark.parametrize ('key_policy, signing_keys', [(None, ['test']), ('first', ['test']), ('newest', ['newer']), ('all', ['newer', 'other', 'test'])])
+def test_key_policy_picks_the_keys (signing_script, kernel_tree: KernelTree, test_key, other_key, newer_key, key_policy: str, signing_keys: list):
+    '''
+        first signs with the positional key pair, newest with the key whose certificate became valid last and all with every key (void)
+    '''
+
+    policy_arguments = ['--key-policy', key_policy] if key_policy != None else []
+
+    run_script (kernel_tree, '--key', other_key.private_key_path, other_key.public_key_path, '--key', newer_key.private_key_path, newer_key.public_key_path, *policy_arguments)
+
+    assert get_signing_keys (signing_script, kernel_tree, test_key, other_key, newer_key) == [signing_keys] * len (kernel_tree.module_paths)
+
+@pytest.mark.parametrize ('kernels, signing_keys', [(['999.0.*'], ['other']), (['6.*'], ['test']), (None, ['test'])])
+def test_json_keys_for_the_kernel_come_first (signing_script, kernel_tree: KernelTree, test_key, other_key, kernels: list, signing_keys: list):
+    '''
+        A JSON key whose kernel patterns match the kernel comes before the keys used for every kernel, other JSON keys after them (void)
+    '''
+
+    write_json_keys (kernel_tree, [(other_key, kernels)])
+
+    run_script (kernel_tree)
+
+    assert get_signing_keys (signing_script, kernel_tree, test_key, other_key) == [signing_keys] * len (kernel_tree.module_paths)
+
+def test_key_policy_argument_overrides_json (signing_script, kernel_tree: KernelTree, test_key, other_key):
+    '''
+        The key_policy of the modules JSON file applies unless --key-policy is given (void)
+    '''
+
+    write_json_keys (kernel_tree, [(other_key, None)], 'all')
+
+    run_script (kernel_tree, '--key-policy', 'first')
+
+    assert get_signing_keys (signing_script, kernel_tree, test_key, other_key) == [['test']] * len (kernel_tree.module_paths)
+
+    #The test modules are 64 KiB before they are signed
+    for module_path in kernel_tree.module_paths:
+        module_path.write_bytes (module_path.read_bytes () [:64 * 1024])
+
+    run_script (kernel_tree)
+
+    assert get_signing_keys (signing_script, kernel_tree, test_key, other_key) == [['other', 'test']] * len (kernel_tree.module_paths)
+
+def test_newest_key_for_the_kernel (signing_script, kernel_tree: KernelTree, test_key, newer_key):
+    '''
+        With the newest policy a JSON key whose kernels don't match the kernel isn't used even if it is newer (void)
+    '''
+
+    write_json_keys (kernel_tree, [(newer_key, ['6.*'])], 'newest')
+
+    run_script (kernel_tree)
+
+    assert get_signing_keys (signing_script, kernel_tree, test_key, newer_key) == [['test']] * len (kernel_tree.module_paths)
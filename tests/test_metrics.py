@@ -0,0 +1,79 @@
+#License
+'''
+    MIT License (LICENSE.txt)
+
+    Copyright (c) 2016 Kieran Gillibrand
+'''
+
+#Description
+'''
+    Checks that --metrics writes the phase times and module counters of a run as JSON or in the Prometheus text format, also when the run fails
+'''
+
+#Imports
+import pytest
+
+from conftest import KERNEL, KernelTree, run_script, read_metrics
+
+def test_json_metrics_count_modules_and_phases (kernel_tree: KernelTree):
+    '''
+        The JSON metrics count the modules signed and their bytes, then the modules skipped by the next run, with the time of each phase (void)
+    '''
+
+    run_script (kernel_tree)
+    metrics = read_metrics (kernel_tree)
+
+    assert metrics ['exit_status'] == 0 and metrics ['duration_seconds'] > 0
+    assert (metrics ['counters'] ['modules_signed'], metrics ['counters'] ['modules_skipped'], metrics ['counters'] ['modules_failed']) == (2, 0, 0)
+    assert metrics ['counters'] ['signed_bytes'] == sum (module_path.stat ().st_size for module_path in kernel_tree.module_paths)
+    assert metrics ['phases'] ['module_signing'] ['count'] == 2
+    assert metrics ['phases'] ['kernel_signing'] ['max_seconds'] <= metrics ['phases'] ['kernel_signing'] ['seconds']
+    assert set (metrics ['kernels'] [KERNEL]) >= {'akmods_build', 'kernel_signing'}
+    assert metrics ['hashing'] ['sha256'] ['bytes'] == 2 * 64 * 1024
+
+    run_script (kernel_tree)
+    metrics = read_metrics (kernel_tree)
+
+    assert (metrics ['counters'] ['modules_signed'], metrics ['counters'] ['modules_skipped']) == (0, 2)
+    assert metrics ['counters'] ['signed_bytes'] == 0
+
+def test_metrics_are_written_on_failure (kernel_tree: KernelTree):
+    '''
+        A run which exits with an error still writes its metrics, with its exit status and the failed module (void)
+    '''
+
+    kernel_tree.sign_file_path.write_text ('#!/bin/sh\necho sign-file failed\nexit 1\n')
+
+    run_script (kernel_tree, '--backend', 'sign-file', '-j', '1', exit_code = 2)
+    metrics = read_metrics (kernel_tree)
+
+    assert metrics ['exit_status'] == 2
+    assert metrics ['counters'] ['modules_failed'] >= 1 and metrics ['counters'] ['modules_signed'] == 0
+
+def test_prometheus_metrics (kernel_tree: KernelTree):
+    '''
+        --metrics-format prometheus writes every metric with its help and type lines, prefixed with module_signing_ (void)
+    '''
+
+    run_script (kernel_tree, '--metrics-format', 'prometheus')
+    lines = (kernel_tree.root / 'metrics.json').read_text ().splitlines ()
+
+    assert '# HELP module_signing_modules Modules by outcome during the last run' in lines
+    assert '# TYPE module_signing_modules gauge' in lines
+    assert 'module_signing_modules{result="signed"} 2.0' in lines
+    assert 'module_signing_modules{result="skipped"} 0.0' in lines
+    assert 'module_signing_last_run_exit_status 0.0' in lines
+    assert 'module_signing_phase_runs{phase="module_signing"} 2.0' in lines
+    assert any (line.startswith ('module_signing_kernel_phase_seconds{kernel="%s",phase="akmods_build"} ' %KERNEL) for line in lines)
+    assert all (line.startswith (('# HELP module_signing_', '# TYPE module_signing_', 'module_signing_')) for line in lines)
+    assert not (kernel_tree.root / 'metrics.json.tmp').exists ()
+
+def test_prometheus_labels_are_escaped (signing_script):
+    '''
+        Backslashes, quotes and newlines in label values are escaped (void)
+    '''
+
+    metrics = signing_script.collect_metrics (0.0, 1.0, 0)
+    metrics ['phases'] = {'a\\b"c\nd': {'seconds': 1.5, 'count': 1, 'max_seconds': 1.5}}
+
+    assert 'module_signing_phase_seconds{phase="a\\\\b\\"c\\nd"} 1.5' in signing_script.format_prometheus_metrics (metrics).splitlines ()
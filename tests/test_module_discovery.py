@@ -0,0 +1,107 @@
+#License
+'''
+    MIT License (LICENSE.txt)
+
+    Copyright (c) 2016 Kieran Gillibrand
+'''
+
+#Description
+'''
+    Checks that the module_files of the modules JSON file can be glob patterns or recursive entries, resolved with one scan of each directory, and that --dry-run only prints them
+'''
+
+#Imports
+import os
+
+import pytest
+
+from conftest import KERNEL, KernelTree, run_script, is_signed
+
+@pytest.fixture
+def module_tree (signing_script, tmp_path, monkeypatch) -> str:
+    '''
+        Creates the modules directory of a kernel with vendor modules (some compressed, one in a subdirectory and one left behind by an interrupted run) and points the signing code at it (str)
+    '''
+
+    kernel_directory = tmp_path / 'modules' / KERNEL
+    (kernel_directory / 'extra' / 'nvidia' / 'sub').mkdir (parents = True)
+    (kernel_directory / 'extra' / 'vbox').mkdir (parents = True)
+
+    for relative_path in ('nvidia/nvidia.ko', 'nvidia/nvidia-drm.ko.xz', 'nvidia/nvidia-peermem.ko', 'nvidia/nvidia.ko.~signed~', 'nvidia/README.txt', 'nvidia/sub/nvidia-uvm.ko', 'vbox/vboxdrv.ko.xz'):
+        (kernel_directory / 'extra' / relative_path).write_bytes (b'')
+
+    monkeypatch.setattr (signing_script, 'MODULES_ROOT', str (tmp_path / 'modules'))
+
+    return str (kernel_directory / 'extra')
+
+def test_patterns_and_names_are_resolved (signing_script, module_tree: str):
+    '''
+        Patterns match modules with or without a compression suffix, names find a compressed module and a module matched twice is listed once, in entry order (void)
+    '''
+
+    module_entries = [{'name': 'Nvidia', 'directory': 'extra/nvidia/', 'module_files': ['nvidia*.ko', 'nvidia.ko']}, {'name': 'VirtualBox', 'directory': 'extra/vbox', 'module_files': ['vboxdrv.ko', 'vboxnetflt.ko']}]
+
+    assert signing_script.resolve_module_files (KERNEL, module_entries) == [
+        ('Nvidia', os.path.join (module_tree, 'nvidia', 'nvidia-drm.ko.xz')),
+        ('Nvidia', os.path.join (module_tree, 'nvidia', 'nvidia-peermem.ko')),
+        ('Nvidia', os.path.join (module_tree, 'nvidia', 'nvidia.ko')),
+        ('VirtualBox', os.path.join (module_tree, 'vbox', 'vboxdrv.ko.xz')),
+        ('VirtualBox', os.path.join (module_tree, 'vbox', 'vboxnetflt.ko'))]
+
+def test_recursive_entry_matches_subdirectories (signing_script, module_tree: str):
+    '''
+        A recursive entry matches its patterns in every subdirectory, by file name or by path relative to the entry directory (void)
+    '''
+
+    module_entries = [{'name': 'Nvidia', 'directory': 'extra', 'recursive': True, 'module_files': ['*-uvm.ko', 'vbox/*.ko']}]
+
+    assert signing_script.resolve_module_files (KERNEL, module_entries) == [('Nvidia', os.path.join (module_tree, 'nvidia', 'sub', 'nvidia-uvm.ko')), ('Nvidia', os.path.join (module_tree, 'vbox', 'vboxdrv.ko.xz'))]
+
+def test_each_directory_is_scanned_once (signing_script, module_tree: str, monkeypatch):
+    '''
+        Every pattern of the entries sharing a directory is matched against one scan of it (void)
+    '''
+
+    scanned_directories = []
+    scandir = os.scandir
+
+    def counting_scandir (path):
+        scanned_directories.append (os.path.normpath (path))
+
+        return scandir (path)
+
+    monkeypatch.setattr (os, 'scandir', counting_scandir)
+
+    module_entries = [{'name': 'Nvidia', 'directory': 'extra/nvidia', 'module_files': ['nvidia.ko*', 'nvidia-*.ko']}, {'name': 'Nvidia UVM', 'directory': 'extra/nvidia/', 'module_files': ['*peermem*']}]
+
+    assert len (signing_script.resolve_module_files (KERNEL, module_entries)) == 3
+    assert scanned_directories == [os.path.join (module_tree, 'nvidia')]
+
+def test_missing_directory_is_reported (signing_script, module_tree: str):
+    '''
+        An entry whose directory doesn't exist for the kernel raises FileNotFoundError with the directory (void)
+    '''
+
+    with pytest.raises (FileNotFoundError) as directory_error:
+        signing_script.resolve_module_files (KERNEL, [{'name': 'Missing', 'directory': 'extra/missing', 'module_files': ['*.ko']}])
+
+    assert directory_error.value.filename == os.path.join (module_tree, 'missing')
+
+def test_dry_run_only_prints_modules (kernel_tree: KernelTree):
+    '''
+        --dry-run prints the resolved modules of each kernel and how many would be signed without building or signing anything, --debug prints them while signing (void)
+    '''
+
+    output = run_script (kernel_tree, '--dry-run')
+
+    assert 'Kernel %s:\n' %KERNEL in output
+    assert all ('    Test: %s\n' %module_path in output for module_path in kernel_tree.module_paths)
+    assert 'Kernel %s: would sign 2 module(s)' %KERNEL in output
+    assert 'Dry run: would sign 2 module(s) for 1 kernel(s)' in output
+    assert 'have been signed' not in output
+    assert not any (is_signed (module_path) for module_path in kernel_tree.module_paths)
+    assert not kernel_tree.akmods_log_path.exists ()
+
+    output = run_script (kernel_tree, '--debug')
+
+    assert 'Kernel module files for kernel %s: %s' %(KERNEL, [str (module_path) for module_path in kernel_tree.module_paths]) in output
@@ -0,0 +1,44 @@
+#License
+'''
+    MIT License (LICENSE.txt)
+
+    Copyright (c) 2016 Kieran Gillibrand
+'''
+
+#Description
+'''
+    Checks the signatures of the native backend byte for byte against openssl cms, which creates the same signatures as sign-file
+'''
+
+#Imports
+import subprocess
+
+import pytest
+
+@pytest.mark.parametrize ('hash_algorithm', ['sha256', 'sha384', 'sha512'])
+def test_signature_matches_openssl (signing_script, test_key, tmp_path, hash_algorithm: str):
+    '''
+        The CMS signature of create_multi_signer_signature () is the one openssl cms -sign -binary -noattr -nocerts creates for the same module (void)
+    '''
+
+    module_path = tmp_path / 'test.ko'
+    module_path.write_bytes (bytes (range (256)) * 1000)
+
+    signing_key = signing_script.load_signing_key (test_key.private_key_path, test_key.public_key_path)
+    digests = signing_script.hash_module (module_path.read_bytes (), {hash_algorithm})
+    signature = signing_script.create_multi_signer_signature ([(signing_key, hash_algorithm)], digests)
+
+    openssl_signature = subprocess.run (['openssl', 'cms', '-sign', '-binary', '-noattr', '-nocerts', '-md', hash_algorithm, '-signer', test_key.certificate_pem_path, '-inkey', test_key.private_key_path, '-in', str (module_path), '-outform', 'DER'], check = True, stdout = subprocess.PIPE).stdout
+
+    assert signature [:-signing_script.MODULE_TRAILER_SIZE] == openssl_signature
+
+def test_faulty_signature_is_rejected (signing_script, test_key):
+    '''
+        A signature from a key whose CRT parameters don't match its modulus (Ex: a fault during signing) raises ValueError instead of being used (void)
+    '''
+
+    signing_key = signing_script.load_signing_key (test_key.private_key_path, test_key.public_key_path)
+    faulty_key = signing_key._replace (exponent1 = signing_key.exponent1 + 1)
+
+    with pytest.raises (ValueError):
+        signing_script.rsa_sign_digest (faulty_key, 'sha256', bytes (32))
@@ -0,0 +1,50 @@
+#License
+'''
+    MIT License (LICENSE.txt)
+
+    Copyright (c) 2016 Kieran Gillibrand
+'''
+
+#Description
+'''
+    Checks that modules signed on several workers are reported in kernel order and that the first failure in that order is the one reported, however the workers were scheduled
+'''
+
+#Imports
+import re
+
+import pytest
+
+from conftest import KERNEL, KernelTree, install_kernel, run_script, is_signed
+
+OTHER_KERNEL = '998.0.0-1.test.x86_64'
+'''A second kernel, older than KERNEL'''
+
+MODULE_NAMES = tuple ('test%d.ko' %module_number for module_number in range (1, 9))
+'''The modules of the second kernel, enough to keep every worker busy'''
+
+@pytest.mark.parametrize ('helper_arguments', [[], ['--no-helper']])
+def test_parallel_run_signs_every_module_in_kernel_order (kernel_tree: KernelTree, helper_arguments: list):
+    '''
+        With several workers every module of every kernel is signed and the kernels are reported in the order they were given (void)
+    '''
+
+    module_paths = kernel_tree.module_paths + install_kernel (kernel_tree.root, OTHER_KERNEL, MODULE_NAMES)
+
+    output = run_script (kernel_tree, '-k', OTHER_KERNEL, KERNEL, '-j', '4', *helper_arguments)
+
+    assert all (is_signed (module_path) for module_path in module_paths)
+    assert re.findall (r'Kernel (\S+): signed (\d+) module', output) == [(OTHER_KERNEL, str (len (MODULE_NAMES))), (KERNEL, str (len (kernel_tree.module_paths)))]
+
+def test_first_failure_in_order_is_reported (kernel_tree: KernelTree):
+    '''
+        When two modules fail, the one queued first is reported even though the other one fails sooner (void)
+    '''
+
+    #test1.ko fails after the other workers have finished, test2.ko fails straight away
+    kernel_tree.sign_file_path.write_text ('#!/bin/sh\ncase "$5" in\n  *test1.ko) sleep 1; echo slow failure; exit 3;;\n  *test2.ko) echo fast failure; exit 4;;\nesac\nexit 0\n')
+
+    output = run_script (kernel_tree, '--backend', 'sign-file', '-j', '4', exit_code = 2)
+
+    assert 'Error signing kernel module: %s' %kernel_tree.module_paths [0] in output
+    assert 'slow failure' in output and 'fast failure' not in output
@@ -0,0 +1,99 @@
+#License
+'''
+    MIT License (LICENSE.txt)
+
+    Copyright (c) 2016 Kieran Gillibrand
+'''
+
+#Description
+'''
+    Checks that akmods builds overlap with the signing of the kernels built before them and with each other, and that each stage reports its time
+'''
+
+#Imports
+import sys
+
+from conftest import KERNEL, KernelTree, install_kernel, run_script, read_metrics, is_signed
+
+OLD_KERNEL = '998.0.0-1.test.x86_64'
+'''The kernel built and signed first'''
+
+AKMODS_SCRIPT = '''#!%s
+#Marks the kernel's build as started, then waits for the file (or signed module) a kernel's build depends on, fails if it doesn't appear
+import sys
+import os
+import time
+
+def is_ready (wait_path):
+    if not os.path.exists (wait_path) or not wait_path.endswith ('.ko'):
+        return os.path.exists (wait_path)
+
+    with open (wait_path, 'rb') as module_file:
+        return module_file.read ().endswith (b'~Module signature appended~\\n')
+
+kernel = sys.argv [2]
+open (os.path.join (%r, kernel + '.started'), 'w').close ()
+
+wait_path = %r.get (kernel)
+deadline = time.monotonic () + 20
+
+while wait_path != None and not is_ready (wait_path):
+    if time.monotonic () > deadline:
+        sys.exit ('Timed out waiting for: ' + wait_path)
+
+    time.sleep (0.05)
+'''
+'''A stub akmods which only finishes a kernel's build once what it waits for exists, given the root of the tree and the path each kernel waits for'''
+
+def write_akmods (kernel_tree: KernelTree, wait_paths: dict):
+    '''
+        Replaces the stub akmods of the tree with one which makes each build wait for a path (void)
+
+        kernel_tree (KernelTree): The tree from the kernel_tree fixture
+        wait_paths (dict): The path (a module to be signed or a file to exist) each kernel's build waits for
+    '''
+
+    akmods_path = kernel_tree.root / 'akmods'
+    akmods_path.write_text (AKMODS_SCRIPT %(sys.executable, str (kernel_tree.root), {kernel: str (wait_path) for kernel, wait_path in wait_paths.items ()}))
+
+def test_next_build_overlaps_signing (kernel_tree: KernelTree):
+    '''
+        The build of the second kernel can only finish once the modules of the first are signed, which deadlocks unless they overlap (void)
+    '''
+
+    old_module_paths = install_kernel (kernel_tree.root, OLD_KERNEL)
+    write_akmods (kernel_tree, {KERNEL: old_module_paths [-1]})
+
+    run_script (kernel_tree, '-k', OLD_KERNEL, KERNEL, '-j', '1')
+
+    assert all (is_signed (module_path) for module_path in old_module_paths + kernel_tree.module_paths)
+
+def test_builds_run_at_once (kernel_tree: KernelTree):
+    '''
+        With --build-jobs 2 the build of the first kernel can wait for the build of the second to start (void)
+    '''
+
+    old_module_paths = install_kernel (kernel_tree.root, OLD_KERNEL)
+    write_akmods (kernel_tree, {OLD_KERNEL: kernel_tree.root / (KERNEL + '.started')})
+
+    run_script (kernel_tree, '-k', OLD_KERNEL, KERNEL, '--build-jobs', '2')
+
+    assert all (is_signed (module_path) for module_path in old_module_paths + kernel_tree.module_paths)
+
+def test_stages_report_their_time (kernel_tree: KernelTree):
+    '''
+        The akmods build and the signing of each kernel are printed with how long they took and recorded by kernel in the metrics (void)
+    '''
+
+    install_kernel (kernel_tree.root, OLD_KERNEL)
+
+    output = run_script (kernel_tree, '-k', OLD_KERNEL, KERNEL)
+    metrics = read_metrics (kernel_tree)
+
+    for kernel in (OLD_KERNEL, KERNEL):
+        assert 'Kernel %s: akmods built (or already present) in ' %kernel in output
+        assert 'Kernel %s: signed 2 module(s), skipped 0 already signed module(s) in ' %kernel in output
+        assert set (metrics ['kernels'] [kernel]) >= {'akmods_build', 'kernel_signing'}
+
+    assert metrics ['phases'] ['akmods_build'] ['count'] == 2
+    assert kernel_tree.akmods_log_path.read_text () == ''.join ('--kernels %s --force\n' %kernel for kernel in (OLD_KERNEL, KERNEL))
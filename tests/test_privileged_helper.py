@@ -0,0 +1,159 @@
+#License
+'''
+    MIT License (LICENSE.txt)
+
+    Copyright (c) 2016 Kieran Gillibrand
+'''
+
+#Description
+'''
+    Runs the privileged helper against a kernel tree in a temporary directory and checks that it rejects requests naming anything outside of its own configuration
+    and that what it measures reaches the script's metrics
+'''
+
+#Imports
+import sys
+import os
+import subprocess
+import json
+import gzip
+import pathlib
+
+import pytest
+
+from conftest import SCRIPT_PATH, KERNEL, KernelTree, run_script, is_signed
+
+@pytest.fixture
+def helper_tree (kernel_tree: KernelTree) -> dict:
+    '''
+        Adds a module outside of the modules root to the tree of the kernel_tree fixture (dict)
+    '''
+
+    outside_path = kernel_tree.root / 'outside.ko'
+    outside_path.write_bytes (os.urandom (4096))
+
+    return {'root': kernel_tree.root, 'module_path': str (kernel_tree.module_paths [0]), 'outside_path': str (outside_path), 'akmods_path': str (kernel_tree.root / 'akmods'), 'akmods_log_path': kernel_tree.akmods_log_path}
+
+def run_helper (helper_tree: dict, test_key, requests: list) -> dict:
+    '''
+        Starts the privileged helper as the current user with the test key, sends it the requests and returns its responses by request id (dict)
+
+        helper_tree (dict): The tree from the helper_tree fixture
+        test_key (TestKey): The only key the helper is configured with
+        requests (list <tuple (str, dict)>): The action and arguments of each request
+    '''
+
+    helper_arguments = ['--privileged-helper', '--backend', 'native', '--modules-root', str (helper_tree ['root'] / 'modules'), '--kernel-sources-root', str (helper_tree ['root'] / 'kernels'), '--akmods-command', helper_tree ['akmods_path'], '--key', test_key.private_key_path, test_key.public_key_path]
+    session_line = json.dumps ({'jobs': 1, 'build_timeout': None, 'sign_timeout': None, 'debug': False})
+    request_lines = [json.dumps ({'id': request_id, 'action': action, 'arguments': arguments}) for request_id, (action, arguments) in enumerate (requests)]
+
+    helper = subprocess.run ([sys.executable, SCRIPT_PATH] + helper_arguments, input = '\n'.join ([session_line] + request_lines) + '\n', stdout = subprocess.PIPE, universal_newlines = True, timeout = 60, check = True)
+    responses = [json.loads (response_line) for response_line in helper.stdout.splitlines ()]
+
+    assert responses [0] == {'ready': True}
+
+    return {response ['id']: response for response in responses if 'id' in response}
+
+def test_valid_requests_succeed (helper_tree: dict, test_key):
+    '''
+        A build request for the installed kernel runs akmods and a sign request for its module with the configured key signs it (void)
+    '''
+
+    responses = run_helper (helper_tree, test_key, [('build', {'kernel': KERNEL}), ('sign', {'module_path': helper_tree ['module_path'], 'signers': [[0, 'sha256']]})])
+
+    assert [responses [request_id] ['status'] for request_id in (0, 1)] == [0, 0]
+    assert helper_tree ['akmods_log_path'].read_text () == '--kernels %s --force\n' %KERNEL
+    assert is_signed (helper_tree ['module_path'])
+
+@pytest.mark.parametrize ('kernel', ['-rf', '--help', '..', '.', '', KERNEL + '/extra', '../' + KERNEL, '999.0.0-2.test.x86_64', None, ['999.0.0-1.test.x86_64']])
+def test_invalid_kernel_is_rejected (helper_tree: dict, test_key, kernel):
+    '''
+        A build request for anything but the bare name of an installed kernel is rejected without running akmods (void)
+    '''
+
+    responses = run_helper (helper_tree, test_key, [('build', {'kernel': kernel})])
+
+    assert responses [0] ['status'] != 0
+    assert 'Not an installed kernel' in responses [0] ['error']
+    assert not helper_tree ['akmods_log_path'].exists ()
+
+@pytest.mark.parametrize ('module_path', ['dot_dot_escape', 'symlink_escape', 'outside', 'modules_root', 'not_a_kernel', 'not_a_module', 'relative'])
+def test_invalid_module_path_is_rejected (helper_tree: dict, test_key, module_path: str):
+    '''
+        A sign request for a file which isn't a module inside /usr/lib/modules/<kernel> of an installed kernel is rejected without changing it (void)
+    '''
+
+    root = helper_tree ['root']
+    kernel_directory = root / 'modules' / KERNEL
+
+    if module_path == 'dot_dot_escape':
+        target_path = helper_tree ['outside_path']
+        module_path = str (kernel_directory / 'extra' / '..' / '..' / '..' / 'outside.ko')
+
+    elif module_path == 'symlink_escape':
+        target_path = helper_tree ['outside_path']
+        module_path = str (kernel_directory / 'extra' / 'test' / 'escape.ko')
+        os.symlink (target_path, module_path)
+
+    elif module_path == 'outside':
+        target_path = module_path = helper_tree ['outside_path']
+
+    elif module_path == 'modules_root':
+        target_path = module_path = str (root / 'modules' / 'root.ko')
+        pathlib.Path (target_path).write_bytes (os.urandom (4096))
+
+    elif module_path == 'not_a_kernel':
+        os.makedirs (str (root / 'modules' / 'extra'))
+        target_path = module_path = str (root / 'modules' / 'extra' / 'test.ko')
+        pathlib.Path (target_path).write_bytes (os.urandom (4096))
+
+    elif module_path == 'not_a_module':
+        target_path = module_path = str (kernel_directory / 'modules.dep')
+        pathlib.Path (target_path).write_bytes (os.urandom (4096))
+
+    else:
+        #Resolved against the helper's working directory, not the modules root
+        target_path = helper_tree ['module_path']
+        module_path = os.path.join ('extra', 'test', 'test.ko')
+
+    original_data = pathlib.Path (target_path).read_bytes ()
+    responses = run_helper (helper_tree, test_key, [('sign', {'module_path': module_path, 'signers': [[0, 'sha256']]})])
+
+    #A module of a directory which isn't an installed kernel fails the kernel check instead
+    assert responses [0] ['status'] != 0
+    assert responses [0] ['error'].startswith ('Not an installed kernel' if 'modules/extra/' in module_path else 'Not a kernel module')
+    assert pathlib.Path (target_path).read_bytes () == original_data
+
+@pytest.mark.parametrize ('signers', [[], [[1, 'sha256']], [[-1, 'sha256']], [[0, 'md5']], [[0, 'sha256'], [1, 'sha256']], [['KEY', 'sha256']], [['KEY', 'CERTIFICATE', 'sha256']], 'sha256', None])
+def test_invalid_signers_are_rejected (helper_tree: dict, test_key, signers):
+    '''
+        A sign request for a key the helper wasn't started with (by position or by path) or an unknown hash algorithm is rejected without signing (void)
+    '''
+
+    #The paths of the configured key itself are rejected too, a request can only pick a key by its position
+    signers = json.loads (json.dumps (signers).replace ('"KEY"', json.dumps (test_key.private_key_path)).replace ('"CERTIFICATE"', json.dumps (test_key.public_key_path)))
+
+    responses = run_helper (helper_tree, test_key, [('sign', {'module_path': helper_tree ['module_path'], 'signers': signers})])
+
+    assert responses [0] ['status'] != 0
+    assert 'Invalid signers' in responses [0] ['error']
+    assert not is_signed (helper_tree ['module_path'])
+
+def test_codec_statistics_reach_metrics (kernel_tree: KernelTree):
+    '''
+        The compression throughput measured in the helper is written to the metrics and printed in debug output like without the helper (void)
+    '''
+
+    for module_path in kernel_tree.module_paths:
+        with open (str (module_path) + '.gz', 'wb') as compressed_file:
+            compressed_file.write (gzip.compress (module_path.read_bytes ()))
+
+        module_path.unlink ()
+
+    for helper_arguments in ([], ['--no-helper']):
+        output = run_script (kernel_tree, '-f', '-d', *helper_arguments)
+        codecs = json.loads ((kernel_tree.root / 'metrics.json').read_text ()) ['codecs']
+
+        assert all (is_signed (str (module_path) + '.gz') for module_path in kernel_tree.module_paths)
+        assert codecs ['gzip'] ['decompress_bytes'] > 0 and codecs ['gzip'] ['compress_bytes'] > 0
+        assert 'gzip: decompressed' in output and 'gzip: compressed' in output
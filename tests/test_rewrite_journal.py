@@ -0,0 +1,119 @@
+#License
+'''
+    MIT License (LICENSE.txt)
+
+    Copyright (c) 2016 Kieran Gillibrand
+'''
+
+#Description
+'''
+    Checks that the rewrite journal of a run that is still going is left alone by another run and that a finished rewrite is only rolled forward over the module it began from
+'''
+
+#Imports
+import os
+import json
+import fcntl
+
+import pytest
+
+@pytest.fixture
+def journal (signing_script, tmp_path):
+    '''
+        A journal with a rewrite in progress and its temporary file, the journal opened by the test is closed afterwards (tuple (str, str))
+    '''
+
+    module_path = tmp_path / 'test.ko'
+    module_path.write_bytes (b'unsigned')
+
+    temporary_path = tmp_path / 'test.ko.~signed~'
+    temporary_path.write_bytes (b'partial')
+
+    journal_path = tmp_path / 'journal.jsonl'
+    journal_path.write_text (json.dumps ({'state': 'begin', 'module': str (module_path), 'temporary': str (temporary_path), 'size': None}) + '\n')
+
+    yield (str (journal_path), str (temporary_path))
+
+    if signing_script.REWRITE_JOURNAL != None:
+        os.close (signing_script.REWRITE_JOURNAL.descriptor)
+
+    signing_script.REWRITE_JOURNAL = None
+
+def test_locked_journal_is_not_recovered (signing_script, journal: tuple):
+    '''
+        While another run holds the journal lock its rewrite in progress is kept and the journal isn't truncated (void)
+    '''
+
+    journal_path, temporary_path = journal
+    journal_contents = open (journal_path).read ()
+
+    with open (journal_path, 'a') as other_run:
+        fcntl.flock (other_run, fcntl.LOCK_EX)
+
+        signing_script.open_rewrite_journal (journal_path)
+
+        assert signing_script.REWRITE_JOURNAL == None
+        assert os.path.exists (temporary_path)
+        assert open (journal_path).read () == journal_contents
+
+def test_unlocked_journal_is_recovered (signing_script, journal: tuple):
+    '''
+        Once no other run holds the lock the interrupted rewrite is undone and a new, empty journal is started (void)
+    '''
+
+    journal_path, temporary_path = journal
+
+    signing_script.open_rewrite_journal (journal_path)
+
+    assert signing_script.REWRITE_JOURNAL != None
+    assert not os.path.exists (temporary_path)
+    assert os.path.getsize (journal_path) == 0
+
+def write_ready_journal (signing_script, tmp_path) -> tuple:
+    '''
+        Writes a journal whose rewrite of a module was complete and synced when the run crashed, returns the paths of the journal, module and signed copy (tuple (str, pathlib.Path, pathlib.Path))
+    '''
+
+    module_path = tmp_path / 'test.ko'
+    module_path.write_bytes (b'unsigned')
+
+    temporary_path = tmp_path / 'test.ko.~signed~'
+    temporary_path.write_bytes (b'unsigned and signed')
+
+    original = signing_script.get_module_identity (os.stat (str (module_path)))
+    journal_path = tmp_path / 'journal.jsonl'
+    journal_path.write_text (''.join (json.dumps ({'state': state, 'module': str (module_path), 'temporary': str (temporary_path), 'size': size, 'original': original}) + '\n' for state, size in (('begin', None), ('ready', temporary_path.stat ().st_size))))
+
+    return (str (journal_path), module_path, temporary_path)
+
+def test_ready_rewrite_is_rolled_forward (signing_script, tmp_path):
+    '''
+        A complete signed copy of a module which hasn't changed since the rewrite began replaces it (void)
+    '''
+
+    journal_path, module_path, temporary_path = write_ready_journal (signing_script, tmp_path)
+
+    assert signing_script.recover_rewrite_journal (journal_path) == (1, 0)
+    assert module_path.read_bytes () == b'unsigned and signed'
+    assert not temporary_path.exists ()
+
+@pytest.mark.parametrize ('rebuild', ['rewritten', 'replaced'])
+def test_ready_rewrite_of_rebuilt_module_is_discarded (signing_script, tmp_path, rebuild: str):
+    '''
+        A complete signed copy is removed instead of replacing a module rebuilt since the rewrite began, whether in place or renamed over it (void)
+    '''
+
+    journal_path, module_path, temporary_path = write_ready_journal (signing_script, tmp_path)
+
+    #The same size, only the contents and the inode or modification time tell the rebuild apart
+    if rebuild == 'rewritten':
+        module_path.write_bytes (b'rebuilt!')
+        os.utime (str (module_path), ns = (0, 0))
+
+    else:
+        (tmp_path / 'rebuilt.ko').write_bytes (b'rebuilt!')
+        os.replace (str (tmp_path / 'rebuilt.ko'), str (module_path))
+
+    assert signing_script.recover_rewrite_journal (journal_path) == (0, 1)
+    assert module_path.read_bytes () == b'rebuilt!'
+    assert not temporary_path.exists ()
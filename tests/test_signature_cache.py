@@ -0,0 +1,104 @@
+#License
+'''
+    MIT License (LICENSE.txt)
+
+    Copyright (c) 2016 Kieran Gillibrand
+'''
+
+#Description
+'''
+    Checks that --signature-cache signs a module seen before by copying its cached signature, that entries which aren't a valid signature made with our key are replaced, and that the least recently used entries are evicted
+'''
+
+#Imports
+import os
+import hashlib
+import time
+
+import pytest
+
+from conftest import KernelTree, run_script, read_metrics
+
+def sign_twice (kernel_tree: KernelTree, *arguments: str) -> tuple:
+    '''
+        Signs the modules of the tree with a signature cache, puts the unsigned modules back and returns the signed modules, the cache entries and the cache directory (tuple (list <bytes>, list <pathlib.Path>, pathlib.Path))
+        The modules are signed again by the caller's next run
+
+        kernel_tree (KernelTree): The tree from the kernel_tree fixture
+        arguments (str): More arguments for the script
+    '''
+
+    cache_path = kernel_tree.root / 'cache'
+    unsigned_modules = [module_path.read_bytes () for module_path in kernel_tree.module_paths]
+
+    run_script (kernel_tree, '--signature-cache', str (cache_path), *arguments)
+    signed_modules = [module_path.read_bytes () for module_path in kernel_tree.module_paths]
+
+    for module_path, module_data in zip (kernel_tree.module_paths, unsigned_modules):
+        module_path.write_bytes (module_data)
+
+    return (signed_modules, sorted (cache_path.glob ('*/*.sig')), cache_path)
+
+@pytest.mark.parametrize ('backend', ['native', 'sign-file'])
+def test_cached_signatures_are_copied (kernel_tree: KernelTree, backend: str):
+    '''
+        The first run publishes a signature for each module, the next one copies them without running sign-file (void)
+    '''
+
+    signed_modules, cache_entries, cache_path = sign_twice (kernel_tree, '--backend', backend)
+    metrics = read_metrics (kernel_tree)
+
+    assert len (cache_entries) == 2
+    assert (metrics ['counters'] ['signature_cache_hits'], metrics ['counters'] ['signature_cache_misses']) == (0, 2)
+
+    kernel_tree.sign_file_path.write_text ('#!/bin/sh\necho sign-file was run\nexit 1\n')
+
+    run_script (kernel_tree, '--signature-cache', str (cache_path), '--backend', backend)
+    metrics = read_metrics (kernel_tree)
+
+    assert (metrics ['counters'] ['signature_cache_hits'], metrics ['counters'] ['signature_cache_misses']) == (2, 0)
+    assert [module_path.read_bytes () for module_path in kernel_tree.module_paths] == signed_modules
+
+@pytest.mark.parametrize ('corruption', ['truncated', 'garbage', 'other_key'])
+def test_invalid_entries_are_replaced (kernel_tree: KernelTree, other_key, signing_script, corruption: str):
+    '''
+        A truncated entry, one which isn't a signature or one made with a different key is removed, the module is signed with our key and the entry published again (void)
+    '''
+
+    signed_modules, cache_entries, cache_path = sign_twice (kernel_tree)
+    valid_entries = [entry_path.read_bytes () for entry_path in cache_entries]
+
+    for entry_path, module_path in zip (cache_entries, sorted (kernel_tree.module_paths, key = lambda module_path: hashlib.sha256 (module_path.read_bytes ()).hexdigest ())):
+        if corruption == 'truncated':
+            entry_path.write_bytes (entry_path.read_bytes () [:-100])
+
+        elif corruption == 'garbage':
+            entry_path.write_bytes (os.urandom (512))
+
+        else:
+            signing_key = signing_script.load_signing_key (other_key.private_key_path, other_key.public_key_path)
+            entry_path.write_bytes (signing_script.create_multi_signer_signature ([(signing_key, 'sha256')], {'sha256': hashlib.sha256 (module_path.read_bytes ()).digest ()}))
+
+    run_script (kernel_tree, '--signature-cache', str (cache_path))
+    metrics = read_metrics (kernel_tree)
+
+    assert (metrics ['counters'] ['signature_cache_hits'], metrics ['counters'] ['signature_cache_misses']) == (0, 2)
+    assert [module_path.read_bytes () for module_path in kernel_tree.module_paths] == signed_modules
+    assert [entry_path.read_bytes () for entry_path in cache_entries] == valid_entries
+
+def test_least_recently_used_entries_are_evicted (signing_script, tmp_path):
+    '''
+        Entries are removed oldest first until the cache fits its size, along with temporary files older than an hour (void)
+    '''
+
+    now = time.time ()
+
+    for entry_name, age in (('aa/old.sig', 300), ('bb/newer.sig', 200), ('aa/newest.sig', 100), ('cc/stale.sig.tmp', 7200), ('cc/publishing.sig.tmp', 10)):
+        entry_path = tmp_path / entry_name
+        entry_path.parent.mkdir (exist_ok = True)
+        entry_path.write_bytes (b'x' * 100)
+        os.utime (entry_path, (now - age, now - age))
+
+    signing_script.evict_signature_cache (str (tmp_path), 250)
+
+    assert sorted (str (entry_path.relative_to (tmp_path)) for entry_path in tmp_path.glob ('*/*')) == ['aa/newest.sig', 'bb/newer.sig', 'cc/publishing.sig.tmp']
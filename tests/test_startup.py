@@ -0,0 +1,62 @@
+#License
+'''
+    MIT License (LICENSE.txt)
+
+    Copyright (c) 2016 Kieran Gillibrand
+'''
+
+#Description
+'''
+    Checks that a run with nothing to do exits from module-signing-script.py without importing the signing code and that the signing code's lazy imports share modules already imported
+'''
+
+#Imports
+import sys
+import os
+import subprocess
+import json
+
+from conftest import SCRIPT_PATH
+
+def test_argument_choices_match_signing_code (entry_point, signing_script):
+    '''
+        The --hash-algorithm and --key-policy choices of the script are the ones the signing code supports (void)
+    '''
+
+    assert entry_point.HASH_ALGORITHMS == list (signing_script.HASH_ALGORITHM_OIDS)
+    assert entry_point.KEY_POLICIES == signing_script.KEY_POLICIES
+
+def test_no_op_run_does_not_import_signing_code (tmp_path, test_key):
+    '''
+        The second of two identical runs finds its run plan current and exits before module_signing or concurrent.futures are imported (void)
+    '''
+
+    modules_root = tmp_path / 'modules'
+    modules_root.mkdir ()
+    (tmp_path / 'kernels').mkdir ()
+
+    modules_file = tmp_path / 'modules.json'
+    modules_file.write_text (json.dumps ({'module_entries': [{'name': 'Test', 'directory': 'extra/test/', 'module_files': ['test*.ko']}]}))
+
+    arguments = [SCRIPT_PATH, str (modules_file), test_key.private_key_path, test_key.public_key_path, '--modules-root', str (modules_root), '--kernel-sources-root', str (tmp_path / 'kernels'), '--no-helper',
+                 '--plan-cache', str (tmp_path / 'plan.json'), '--manifest', str (tmp_path / 'manifest.json'), '--journal', str (tmp_path / 'journal'), '--failed-jobs', str (tmp_path / 'failed.json')]
+
+    subprocess.run ([sys.executable] + arguments, check = True, stdout = subprocess.DEVNULL)
+    no_op_run = subprocess.run ([sys.executable, '-X', 'importtime'] + arguments, check = True, stdout = subprocess.PIPE, stderr = subprocess.PIPE, universal_newlines = True)
+
+    imported_modules = {line.rsplit ('|', 1) [-1].strip () for line in no_op_run.stderr.splitlines () if line.startswith ('import time:')}
+
+    assert 'Nothing to do' in no_op_run.stdout
+    assert 'argparse' in imported_modules
+    assert 'module_signing' not in imported_modules
+    assert 'concurrent.futures' not in imported_modules
+
+def test_lazy_import_shares_imported_modules (signing_script):
+    '''
+        A module imported before the signing code is the one the signing code uses instead of a second copy of it (void)
+    '''
+
+    assert signing_script.subprocess is subprocess
+    assert signing_script.lazy_import ('subprocess') is subprocess
+    assert sys.modules ['subprocess'] is subprocess
+    assert signing_script.lazy_import ('module_signing_missing_module') == None
@@ -0,0 +1,40 @@
+#License
+'''
+    MIT License (LICENSE.txt)
+
+    Copyright (c) 2016 Kieran Gillibrand
+'''
+
+#Description
+'''
+    Checks that --verify accepts a module signed with any of the configured keys, not only the positional key pair
+'''
+
+#Imports
+import pytest
+
+@pytest.mark.parametrize ('check_signatures', [False, True])
+def test_module_signed_with_any_configured_key_passes (signing_script, test_key, tmp_path, check_signatures: bool):
+    '''
+        A module signed with the second of two keys is reported as signed, and as another signer once that key is left out (void)
+    '''
+
+    module_path = tmp_path / 'test.ko'
+    module_path.write_bytes (bytes (range (256)) * 100)
+
+    signing_key = signing_script.load_signing_key (test_key.private_key_path, test_key.public_key_path)
+    key_pair = signing_script.KeyPair (test_key.private_key_path, test_key.public_key_path, None, None, signing_key)
+    signing_script.sign_module_native (str (module_path), [(key_pair, 'sha256')])
+
+    certificate = signing_script.load_certificate (test_key.public_key_path)
+    #Stands in for the positional key pair, whose certificate doesn't match the module's signer
+    other_certificates = {b'\x80\x14' + bytes (20): None}
+
+    certificates = dict (other_certificates)
+    certificates.update ({signer_id: certificate for signer_id in certificate.signer_ids})
+
+    verify_options = signing_script.VerifyOptions (certificates, check_signatures, 1)
+    assert signing_script.verify_module_signature (module_path.read_bytes (), verify_options) ['status'] == 'signed'
+
+    verify_options = signing_script.VerifyOptions (other_certificates, check_signatures, 1)
+    assert signing_script.verify_module_signature (module_path.read_bytes (), verify_options) ['status'] == 'other-signer'
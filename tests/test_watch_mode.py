@@ -0,0 +1,232 @@
+#License
+'''
+    MIT License (LICENSE.txt)
+
+    Copyright (c) 2016 Kieran Gillibrand
+'''
+
+#Description
+'''
+    Runs the script in watch mode against a kernel tree in a temporary directory, then installs a new kernel and rewrites a module and checks that both get signed, and that a kernel which fails doesn't stop the watch
+'''
+
+#Imports
+import sys
+import os
+import subprocess
+import json
+import time
+
+import pytest
+
+from conftest import SCRIPT_PATH
+
+OLD_KERNEL = '998.0.0-1.test.x86_64'
+'''The kernel installed when the script starts, newer than any booted kernel so automatic mode signs it'''
+
+NEW_KERNEL = '999.0.0-1.test.x86_64'
+'''The kernel installed while the script is watching'''
+
+BROKEN_KERNEL = '998.5.0-1.test.x86_64'
+'''A kernel whose akmods build fails, installed while the script is watching'''
+
+WAIT_SECONDS = 30
+'''How long to wait for the script to sign a module before the test fails'''
+
+def install_kernel (root: str, kernel: str):
+    '''
+        Creates the modules directory with two unsigned modules and the kernel source directory with a sign-file of a kernel (void)
+
+        root (str): The root of the tree
+        kernel (str): The kernel to install
+    '''
+
+    module_directory = os.path.join (root, 'modules', kernel, 'extra', 'test')
+    os.makedirs (module_directory)
+
+    for module_name in ('test1.ko', 'test2.ko'):
+        write_module (os.path.join (module_directory, module_name))
+
+    #The native backend doesn't run sign-file, it only has to exist for the kernel to be picked up
+    sign_file_path = os.path.join (root, 'kernels', kernel, 'scripts', 'sign-file')
+    os.makedirs (os.path.dirname (sign_file_path))
+
+    with open (sign_file_path, 'w') as sign_file:
+        sign_file.write ('#!/bin/sh\nexit 1\n')
+
+    os.chmod (sign_file_path, 0o755)
+
+def write_module (module_path: str):
+    '''
+        Writes an unsigned module the way an akmods rebuild would, to a temporary file renamed over the module (void)
+
+        module_path (str): The path of the module
+    '''
+
+    with open (module_path + '.tmp', 'wb') as module_file:
+        module_file.write (os.urandom (64 * 1024))
+
+    os.rename (module_path + '.tmp', module_path)
+
+def is_signed (module_path: str) -> bool:
+    '''
+        Returns whether a module ends with the module signature magic string (bool)
+
+        module_path (str): The path of the module
+    '''
+
+    with open (module_path, 'rb') as module_file:
+        return module_file.read ().endswith (b'~Module signature appended~\n')
+
+def wait_until_watching (output_path: str, process: subprocess.Popen):
+    '''
+        Waits until the script has set up its inotify watches, a kernel installed before that isn't picked up (void)
+
+        output_path (str): The file the output of the script goes to
+        process (subprocess.Popen): The script running in watch mode
+    '''
+
+    deadline = time.monotonic () + WAIT_SECONDS
+
+    while 'Watching ' not in open (output_path).read ():
+        assert process.poll () == None, 'The script exited in watch mode with code %d' %process.returncode
+        assert time.monotonic () < deadline, 'Timed out waiting for the script to start watching'
+
+        time.sleep (0.1)
+
+def start_watching (watch_tree: str, test_key) -> subprocess.Popen:
+    '''
+        Starts the script in automatic watch mode on the tree with its output going to output.txt in the tree (Popen)
+
+        watch_tree (str): The tree from the watch_tree fixture
+        test_key (TestKey): The key to sign with
+    '''
+
+    arguments = [sys.executable, SCRIPT_PATH, os.path.join (watch_tree, 'modules.json'), test_key.private_key_path, test_key.public_key_path, '--watch', '--watch-debounce', '0.2',
+                 '--modules-root', os.path.join (watch_tree, 'modules'), '--kernel-sources-root', os.path.join (watch_tree, 'kernels'), '--akmods-command', os.path.join (watch_tree, 'akmods'), '--elevate-command', '',
+                 '--manifest', os.path.join (watch_tree, 'manifest.json'), '--journal', os.path.join (watch_tree, 'journal'), '--failed-jobs', os.path.join (watch_tree, 'failed.json'), '--plan-cache', '']
+
+    #The output goes unbuffered to a file rather than a pipe nobody reads while the test waits
+    with open (os.path.join (watch_tree, 'output.txt'), 'w') as output_file:
+        return subprocess.Popen (arguments, stdout = output_file, stderr = subprocess.STDOUT, env = dict (os.environ, PYTHONUNBUFFERED = '1'))
+
+def get_module_paths (watch_tree: str, kernel: str) -> list:
+    '''
+        Returns the paths of the modules install_kernel () writes for a kernel (list <str>)
+
+        watch_tree (str): The tree from the watch_tree fixture
+        kernel (str): The kernel
+    '''
+
+    return [os.path.join (watch_tree, 'modules', kernel, 'extra', 'test', module_name) for module_name in ('test1.ko', 'test2.ko')]
+
+def wait_for_output (output_path: str, text: str, process: subprocess.Popen):
+    '''
+        Waits until the output of the script contains a text, fails the test if the script exits or takes longer than WAIT_SECONDS (void)
+
+        output_path (str): The file the output of the script goes to
+        text (str): The text to wait for
+        process (subprocess.Popen): The script running in watch mode
+    '''
+
+    deadline = time.monotonic () + WAIT_SECONDS
+
+    while text not in open (output_path).read ():
+        assert process.poll () == None, 'The script exited in watch mode with code %d' %process.returncode
+        assert time.monotonic () < deadline, 'Timed out waiting for the output: %s' %text
+
+        time.sleep (0.1)
+
+def wait_until_signed (module_paths: list, process: subprocess.Popen):
+    '''
+        Waits until every module is signed, fails the test if the script exits or takes longer than WAIT_SECONDS (void)
+
+        module_paths (list <str>): The modules to wait for
+        process (subprocess.Popen): The script running in watch mode
+    '''
+
+    deadline = time.monotonic () + WAIT_SECONDS
+
+    while not all (is_signed (module_path) for module_path in module_paths):
+        assert process.poll () == None, 'The script exited in watch mode with code %d' %process.returncode
+        assert time.monotonic () < deadline, 'Timed out waiting for: %s' %', '.join (module_path for module_path in module_paths if not is_signed (module_path))
+
+        time.sleep (0.1)
+
+@pytest.fixture
+def watch_tree (tmp_path, test_key) -> str:
+    '''
+        Creates a tree with one installed kernel, a stub akmods and a modules JSON file (str)
+    '''
+
+    root = str (tmp_path)
+    install_kernel (root, OLD_KERNEL)
+
+    akmods_path = os.path.join (root, 'akmods')
+
+    with open (akmods_path, 'w') as akmods_file:
+        akmods_file.write ('#!/bin/sh\nif [ "$2" = %s ]; then echo build failed; exit 1; fi\nexit 0\n' %BROKEN_KERNEL)
+
+    os.chmod (akmods_path, 0o755)
+
+    with open (os.path.join (root, 'modules.json'), 'w') as json_file:
+        json.dump ({'module_entries': [{'name': 'Test', 'directory': 'extra/test/', 'module_files': ['test*.ko']}]}, json_file)
+
+    return root
+
+@pytest.mark.skipif (not sys.platform.startswith ('linux'), reason = 'watch mode needs inotify')
+def test_watch_signs_new_kernel_and_rewritten_module (watch_tree: str, test_key):
+    '''
+        In automatic mode the modules of the installed kernel are signed, then those of a kernel installed while watching and then a module rewritten in place (void)
+    '''
+
+    output_path = os.path.join (watch_tree, 'output.txt')
+    process = start_watching (watch_tree, test_key)
+
+    try:
+        old_modules = get_module_paths (watch_tree, OLD_KERNEL)
+        wait_until_signed (old_modules, process)
+        wait_until_watching (output_path, process)
+
+        install_kernel (watch_tree, NEW_KERNEL)
+        wait_until_signed (get_module_paths (watch_tree, NEW_KERNEL), process)
+
+        write_module (old_modules [0])
+        wait_until_signed (old_modules, process)
+
+    finally:
+        process.terminate ()
+        process.wait (timeout = WAIT_SECONDS)
+
+        print (open (output_path).read ())
+
+@pytest.mark.skipif (not sys.platform.startswith ('linux'), reason = 'watch mode needs inotify')
+def test_watch_continues_after_failed_kernel (watch_tree: str, test_key):
+    '''
+        A kernel whose build fails while watching is reported and the next kernel installed is still signed (void)
+    '''
+
+    output_path = os.path.join (watch_tree, 'output.txt')
+    process = start_watching (watch_tree, test_key)
+
+    try:
+        wait_until_signed (get_module_paths (watch_tree, OLD_KERNEL), process)
+        wait_until_watching (output_path, process)
+
+        install_kernel (watch_tree, BROKEN_KERNEL)
+        wait_for_output (output_path, 'Continuing to watch for new kernels and modules', process)
+
+        install_kernel (watch_tree, NEW_KERNEL)
+        wait_until_signed (get_module_paths (watch_tree, NEW_KERNEL), process)
+
+        output = open (output_path).read ()
+
+        assert 'Error: Could not build akmods for kernel: %s' %BROKEN_KERNEL in output
+        assert 'build failed' in output and 'Exiting with exit code' not in output
+        assert not any (is_signed (module_path) for module_path in get_module_paths (watch_tree, BROKEN_KERNEL))
+
+    finally:
+        process.terminate ()
+        process.wait (timeout = WAIT_SECONDS)
+
+        print (open (output_path).read ())